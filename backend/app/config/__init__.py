@@ -1,9 +1,2 @@
-from .ai import (  # noqa: F401
-    AVAILABLE_TOOLS,
-    TOOL_DEFINITIONS,
-    OpenAIClientDep,
-    get_openai_client,
-)
-from .auth import UserDep, init_oauth  # noqa: F401
 from .db import SessionDep, engine  # noqa: F401
 from .settings import Settings, SettingsDep, get_settings  # noqa: F401
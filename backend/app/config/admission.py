@@ -0,0 +1,41 @@
+from typing import Annotated, AsyncIterator
+
+from fastapi import Depends, HTTPException
+
+from app.config.auth import UserDep
+from app.config.settings import get_settings
+from app.utils.admission import AdmissionController, AdmissionRejected, AdmissionSlot
+
+settings = get_settings()
+
+chat_admission = AdmissionController(
+    settings.CHAT_MAX_STREAMS,
+    settings.CHAT_MAX_STREAMS_PER_USER,
+    settings.CHAT_QUEUE_MAX_WAITERS,
+    settings.CHAT_QUEUE_TIMEOUT_SECONDS,
+    settings.CHAT_RATE_LIMIT_PER_MINUTE,
+    settings.CHAT_RATE_LIMIT_BURST,
+)
+
+
+async def admit_chat_stream(user: UserDep) -> AsyncIterator[AdmissionSlot]:
+    """Admit a chat stream for the user, or answer 429/503 with Retry-After.
+
+    The handler binds the slot to the stream it starts; if it fails first,
+    the slot is released here.
+    """
+    try:
+        slot = await chat_admission.admit(user.id)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code, detail=e.detail, headers=e.headers
+        )
+
+    try:
+        yield slot
+    finally:
+        if not slot.bound:
+            slot.release()
+
+
+ChatAdmissionDep = Annotated[AdmissionSlot, Depends(admit_chat_stream)]
@@ -1,20 +1,81 @@
-from typing import Annotated
+import logging
+from importlib.util import find_spec
+from typing import Annotated, Any, Dict
 
-from fastapi import Depends
-from openai import OpenAI
+import httpx
+from fastapi import Depends, Request
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
-from app.config.settings import SettingsDep
+from app.config.settings import Settings
 from app.services.rag import search_edital
 
+logger = logging.getLogger(__name__)
 
-def get_openai_client(settings: SettingsDep):
-    return OpenAI(
+
+def create_openai_client(settings: Settings) -> AsyncOpenAI:
+    """Build the application-wide LLM client on top of a pooled httpx client.
+
+    The pool keeps connections to `OPENAI_BASE_URL` alive between requests, so
+    a turn only pays the TCP+TLS handshake when the pool has to grow.
+    """
+    http2 = settings.OPENAI_HTTP2
+    if http2 and find_spec("h2") is None:
+        logger.warning("OPENAI_HTTP2 is enabled but `h2` is not installed")
+        http2 = False
+
+    http_client = DefaultAsyncHttpxClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+    )
+    return AsyncOpenAI(
         api_key=settings.OPENAI_API_KEY,
         base_url=settings.OPENAI_BASE_URL,
+        http_client=http_client,
+        timeout=httpx.Timeout(
+            settings.OPENAI_READ_TIMEOUT_SECONDS,
+            connect=settings.OPENAI_CONNECT_TIMEOUT_SECONDS,
+            pool=settings.OPENAI_POOL_TIMEOUT_SECONDS,
+        ),
+        max_retries=settings.OPENAI_MAX_RETRIES,
     )
 
 
-OpenAIClientDep = Annotated[OpenAI, Depends(get_openai_client)]
+def openai_pool_metrics(client: AsyncOpenAI, settings: Settings) -> Dict[str, Any]:
+    """Snapshot of the LLM connection pool (open, active and idle connections)."""
+    limits = {
+        "max_connections": settings.OPENAI_MAX_CONNECTIONS,
+        "max_keepalive_connections": settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+    }
+    # httpx does not expose its connection pool publicly; if its internals
+    # change, report the configured limits only
+    try:
+        transport = getattr(getattr(client, "_client", None), "_transport", None)
+        pool = getattr(transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        active = sum(1 for connection in connections if not connection.is_idle())
+    except Exception as e:
+        logger.debug(f"LLM connection pool metrics unavailable: {e}")
+        return limits
+
+    return {
+        **limits,
+        "open_connections": len(connections),
+        "active_connections": active,
+        "idle_connections": len(connections) - active,
+        "utilisation": active / settings.OPENAI_MAX_CONNECTIONS,
+    }
+
+
+def get_openai_client(request: Request) -> AsyncOpenAI:
+    """Return the client created in the application lifespan (see `app.main`)."""
+    return request.app.state.openai_client
+
+
+OpenAIClientDep = Annotated[AsyncOpenAI, Depends(get_openai_client)]
 
 # Tool examples: https://github.com/vercel-labs/ai-sdk-preview-python-streaming/blob/main/api/utils/tools.py
 TOOL_DEFINITIONS = [
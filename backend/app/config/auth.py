@@ -3,9 +3,8 @@ from typing import Annotated
 from authlib.integrations.starlette_client import OAuth  # type: ignore
 from fastapi import Depends, HTTPException, Request
 
-from app.config.db import SessionDep
 from app.config.settings import Settings, SettingsDep, get_settings
-from app.models import User
+from app.repositories.auth import get_user_profile
 from app.schemas.auth import UserCreated
 from app.utils.auth import verify_jwt
 
@@ -30,7 +29,7 @@ def init_oauth(settings: Settings) -> None:
     )
 
 
-def get_current_user(request: Request, settings: SettingsDep, session: SessionDep):
+async def get_current_user(request: Request, settings: SettingsDep):
     token = request.cookies.get("access_token")
     if not token:
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -40,17 +39,24 @@ def get_current_user(request: Request, settings: SettingsDep, session: SessionDe
         raise HTTPException(status_code=401, detail="Invalid token")
 
     user_id = payload.get("sub")
-    user = session.get(User, user_id)
-    if not user:
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    # Tokens issued at login carry the profile: no database access needed
+    if "login" in payload:
+        return UserCreated(
+            id=int(user_id),
+            login=payload["login"],
+            name=payload.get("name"),
+            avatar_url=payload.get("avatar_url"),
+        )
+
+    # Older tokens only carry the id; resolve it through the user cache
+    profile = await get_user_profile(int(user_id))
+    if not profile:
         raise HTTPException(status_code=401, detail="User not found")
 
-    assert user.id is not None
-    return UserCreated(
-        id=user.id,
-        login=user.login,
-        name=user.name,
-        avatar_url=user.avatar_url,
-    )
+    return UserCreated(**profile)
 
 
 UserDep = Annotated[UserCreated, Depends(get_current_user)]
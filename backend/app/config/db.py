@@ -1,20 +1,56 @@
-from typing import Annotated
+from typing import Annotated, Any, AsyncIterator, Dict
 
 from fastapi import Depends
-from sqlmodel import Session, create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.config.settings import get_settings
 
 settings = get_settings()
 
-DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(DATABASE_URL, echo=settings.ENV == "development", future=True)
+def ensure_asyncpg_url(database_url: str) -> str:
+    """Ensure the database URL uses the asyncpg driver."""
+    scheme, separator, rest = database_url.partition("://")
+    if not separator or scheme.split("+")[0] not in ("postgres", "postgresql"):
+        return database_url
+    return f"postgresql+asyncpg://{rest}"
 
 
-def get_session():
-    with Session(engine) as session:
+DATABASE_URL = ensure_asyncpg_url(settings.DATABASE_URL)
+
+engine: AsyncEngine = create_async_engine(
+    DATABASE_URL,
+    echo=settings.ENV == "development",
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+)
+
+
+def new_session() -> AsyncSession:
+    """Session for work outside a request (e.g. background tasks)."""
+    # Objects stay usable after commit without an implicit (async) refresh
+    return AsyncSession(engine, expire_on_commit=False)
+
+
+async def get_session() -> AsyncIterator[AsyncSession]:
+    async with new_session() as session:
         yield session
 
 
-SessionDep = Annotated[Session, Depends(get_session)]
+def db_pool_metrics() -> Dict[str, Any]:
+    """Connection pool usage, reported under `/metrics`."""
+    pool = engine.pool
+    return {
+        "size": pool.size(),  # type: ignore[attr-defined]
+        "checked_out": pool.checkedout(),  # type: ignore[attr-defined]
+        "checked_in": pool.checkedin(),  # type: ignore[attr-defined]
+        "overflow": pool.overflow(),  # type: ignore[attr-defined]
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+    }
+
+
+SessionDep = Annotated[AsyncSession, Depends(get_session)]
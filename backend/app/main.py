@@ -1,14 +1,74 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 
+from app.config.admission import chat_admission
+from app.config.ai import create_openai_client, openai_pool_metrics
+from app.config.db import db_pool_metrics, engine
 from app.config.settings import get_settings
-from app.routers import auth, chat, health
+from app.repositories.auth import user_cache
+from app.routers import auth, chat, health, metrics
+from app.services.rag import rag_metrics, run_rag_loader
+from app.services.semantic_cache import semantic_answer_cache
+from app.services.speculative import speculation_stats
+from app.utils.ai import shutdown_tool_executor
+from app.utils.metrics import register_collector, unregister_collector
+from app.utils.resumable import stream_registry
 
 settings = get_settings()
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled LLM client for the whole process, closed on shutdown
+    openai_client = create_openai_client(settings)
+    app.state.openai_client = openai_client
+    register_collector(
+        "openai_pool", lambda: openai_pool_metrics(openai_client, settings)
+    )
+
+    # Load the RAG index in the background so startup doesn't wait on it;
+    # `/health/ready` reports when retrieval is available. The same task then
+    # hot-swaps to newly activated index versions.
+    rag_task = asyncio.create_task(run_rag_loader(settings.RAG_RELOAD_INTERVAL_SECONDS))
+    register_collector("db_pool", db_pool_metrics)
+    register_collector("auth_user_cache", user_cache.stats)
+    register_collector("rag", rag_metrics)
+    register_collector("semantic_cache", semantic_answer_cache.stats)
+    register_collector("speculative_retrieval", speculation_stats.snapshot)
+    # Finished streams are also evicted on start/get; this covers idle periods
+    evictor_task = asyncio.create_task(
+        stream_registry.run_evictor(max(settings.STREAM_BUFFER_TTL_SECONDS, 1.0))
+    )
+    register_collector("streams", stream_registry.stats)
+    register_collector("chat_admission", chat_admission.stats)
+
+    yield
+
+    rag_task.cancel()
+    evictor_task.cancel()
+    # Let both tasks unwind before the resources they use are closed
+    await asyncio.gather(rag_task, evictor_task, return_exceptions=True)
+    await stream_registry.close()
+    unregister_collector("chat_admission")
+    unregister_collector("streams")
+    unregister_collector("speculative_retrieval")
+    unregister_collector("semantic_cache")
+    unregister_collector("rag")
+    unregister_collector("auth_user_cache")
+    unregister_collector("db_pool")
+    unregister_collector("openai_pool")
+    await openai_client.close()
+    await engine.dispose()
+    # Don't wait on tool calls still hung in their threads; a later startup
+    # (e.g. another TestClient) gets a fresh pool
+    shutdown_tool_executor()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Session middleware is required for OAuth state management
 app.add_middleware(
@@ -27,3 +87,4 @@ app.add_middleware(
 app.include_router(health.router)
 app.include_router(auth.router)
 app.include_router(chat.router)
+app.include_router(metrics.router)
@@ -2,7 +2,7 @@ import uuid
 from datetime import datetime, timezone
 from typing import Optional
 
-from sqlmodel import JSON, Column, Field, SQLModel
+from sqlmodel import JSON, Column, DateTime, Field, Index, SQLModel, UniqueConstraint
 
 
 class Chat(SQLModel, table=True):
@@ -10,11 +10,28 @@ class Chat(SQLModel, table=True):
         default_factory=lambda: str(uuid.uuid4()), primary_key=True
     )
     user_id: int = Field(foreign_key="user.id", index=True)
+    # Rolling summary of every message up to `summary_until_id`, which were
+    # about `summary_source_tokens` tokens before being summarised
+    summary: Optional[str] = None
+    summary_until_id: Optional[int] = None
+    summary_source_tokens: int = 0
 
 
 class Message(SQLModel, table=True):
+    # The UIMessage id is unique per chat, so saving a turn twice is a no-op
+    # History is read newest-first by (created_at, id) keyset
+    __table_args__ = (
+        UniqueConstraint("chat_id", "message_id", name="uq_message_chat_id_message_id"),
+        Index("ix_message_chat_id_created_at_id", "chat_id", "created_at", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     chat_id: str = Field(foreign_key="chat.id", index=True)
+    message_id: str
     user_id: int = Field(foreign_key="user.id")
     data: dict = Field(sa_column=Column(JSON))  # Vercel AI SDK UIMessage format
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    # timestamptz: asyncpg rejects aware datetimes for a naive column
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_column=Column(DateTime(timezone=True), nullable=False),
+    )
@@ -1,94 +1,185 @@
 """Utilities for chat persistence."""
 
-from typing import Any, List
+import base64
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Optional, Tuple
 
-from sqlmodel import col, delete, select
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import col, select, update
 
 from app.config.db import SessionDep
 from app.models import Chat, Message
 
 
-def create_chat(session: SessionDep, user_id: int):
+async def create_chat(session: SessionDep, user_id: int):
     """Create a new chat and return its ID."""
     chat = Chat(user_id=user_id)
     session.add(chat)
-    session.commit()
-    session.refresh(chat)
+    await session.commit()
+    await session.refresh(chat)
     return chat.id
 
 
-def load_chat(
+async def get_user_chat(session: SessionDep, chat_id: str, user_id: int) -> Chat:
+    """Return the chat if it belongs to the user."""
+    chat = await session.get(Chat, chat_id)
+    if not chat or chat.user_id != user_id:
+        raise ValueError(f"Chat {chat_id} not found or access denied")
+    return chat
+
+
+def encode_cursor(message: Message) -> str:
+    """Opaque keyset cursor pointing at `message` (its created_at and id)."""
+    raw = f"{message.created_at.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Parse a cursor from `encode_cursor`; raises ValueError if malformed."""
+    try:
+        created_at, message_id = base64.urlsafe_b64decode(cursor).decode().split("|")
+        timestamp = datetime.fromisoformat(created_at)
+        message_pk = int(message_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    # Rows are stored as UTC; a naive value read back from the column is UTC too
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp, message_pk
+
+
+async def load_chat(
     session: SessionDep,
     chat_id: str,
     user_id: int,
+    max_messages: Optional[int] = None,
+    after_id: Optional[int] = None,
 ) -> List[dict[str, Any]]:
     """
     Load chat messages from database.
-    Returns a list of UIMessage-compatible dictionaries.
+    Returns a list of UIMessage-compatible dictionaries, oldest first; with
+    `max_messages`, only the most recent ones, and with `after_id`, only
+    messages stored after that row (e.g. the ones not yet summarised).
     """
-    # Verify chat belongs to user
-    chat = session.get(Chat, chat_id)
-    if not chat or chat.user_id != user_id:
-        raise ValueError(f"Chat {chat_id} not found or access denied")
+    await get_user_chat(session, chat_id, user_id)
+
+    statement = select(Message).where(Message.chat_id == chat_id)
+    if after_id is not None:
+        statement = statement.where(col(Message.id) > after_id)
+    statement = statement.order_by(
+        col(Message.created_at).desc(), col(Message.id).desc()
+    ).limit(max_messages)
+
+    db_messages = list((await session.exec(statement)).all())
+    return [msg.data for msg in reversed(db_messages)]
+
+
+async def load_unsummarized_messages(session: SessionDep, chat: Chat) -> List[Message]:
+    """Messages stored after the chat's summary, oldest first."""
+    statement = select(Message).where(Message.chat_id == chat.id)
+    if chat.summary_until_id is not None:
+        statement = statement.where(col(Message.id) > chat.summary_until_id)
+    statement = statement.order_by(col(Message.created_at).asc(), col(Message.id).asc())
+    return list((await session.exec(statement)).all())
 
-    # Load messages ordered by creation time
+
+async def save_chat_summary(
+    session: SessionDep,
+    chat: Chat,
+    summary: str,
+    summary_until_id: int,
+    summary_source_tokens: int,
+) -> bool:
+    """
+    Store a new rolling summary for the chat, unless another one was saved
+    since `chat` was loaded. Returns whether the summary was stored.
+    """
     statement = (
-        select(Message)
-        .where(Message.chat_id == chat_id)
-        .order_by(col(Message.created_at).asc())
+        update(Chat)
+        .where(col(Chat.id) == chat.id)
+        .where(
+            col(Chat.summary_until_id).is_(None)
+            if chat.summary_until_id is None
+            else col(Chat.summary_until_id) == chat.summary_until_id
+        )
+        .values(
+            summary=summary,
+            summary_until_id=summary_until_id,
+            summary_source_tokens=summary_source_tokens,
+        )
     )
-    result = session.exec(statement)
-    db_messages = list(result.all())
+    result = await session.exec(statement)
+    await session.commit()
+    return result.rowcount == 1
+
+
+async def load_chat_page(
+    session: SessionDep,
+    chat_id: str,
+    user_id: int,
+    limit: int,
+    before: Optional[Tuple[datetime, int]] = None,
+) -> Tuple[List[dict[str, Any]], Optional[str]]:
+    """
+    Load one page of chat messages, newest page first (keyset pagination on
+    `created_at, id`). Returns the page oldest first and the cursor for the
+    previous page, or None when there are no older messages.
+    """
+    await get_user_chat(session, chat_id, user_id)
 
-    # Convert to UIMessage format
-    ui_messages = []
-    for msg in db_messages:
-        ui_messages.append(msg.data)
+    statement = select(Message).where(Message.chat_id == chat_id)
+    if before is not None:
+        statement = statement.where(
+            tuple_(col(Message.created_at), col(Message.id)) < tuple_(*before)
+        )
+    statement = statement.order_by(
+        col(Message.created_at).desc(), col(Message.id).desc()
+    ).limit(limit + 1)
+
+    db_messages = list((await session.exec(statement)).all())
+    has_more = len(db_messages) > limit
+    db_messages = list(reversed(db_messages[:limit]))
 
-    return ui_messages
+    next_cursor = encode_cursor(db_messages[0]) if has_more else None
+    return [msg.data for msg in db_messages], next_cursor
 
 
-def save_chat(
+async def save_chat(
     session: SessionDep,
     chat_id: str,
     user_id: int,
     messages: List[dict[str, Any]],
 ):
     """
-    Save chat messages to database.
-    messages should be in UIMessage format (list of dictionaries).
+    Append new chat messages to the database.
+    messages should be in UIMessage format (list of dictionaries) and only
+    contain the turn's new messages; ones whose id is already stored for the
+    chat are skipped, so saving the same turn twice is a no-op.
     """
-    # Verify chat belongs to user
-    chat = session.get(Chat, chat_id)
-    if not chat or chat.user_id != user_id:
-        raise ValueError(f"Chat {chat_id} not found or access denied")
-
-    # Delete existing messages for this chat
-    delete_messages = delete(Message).where(col(Message.chat_id) == chat_id)
-    session.exec(delete_messages)
-
-    # Save new messages
-    for msg_data in messages:
-        # Extract role and content for legacy fields
-        role = msg_data.get("role", "user")
-        content = ""
-        if "parts" in msg_data:
-            text_parts = [
-                part.get("text", "")
-                for part in msg_data["parts"]
-                if part.get("type") == "text"
-            ]
-            content = "".join(text_parts)
-        elif "content" in msg_data:
-            content = msg_data["content"]
-
-        message = Message(
-            chat_id=chat_id,
-            user_id=user_id,
-            data=msg_data,
-            role=role,
-            content=content,
-        )
-        session.add(message)
-
-    session.commit()
+    await get_user_chat(session, chat_id, user_id)
+
+    if not messages:
+        return
+
+    # One multi-row INSERT; each row gets a later timestamp than the one
+    # before it, so the turn keeps its order by created_at alone
+    created_at = datetime.now(timezone.utc)
+    rows = [
+        {
+            "chat_id": chat_id,
+            "message_id": msg_data.get("id") or f"msg-{uuid.uuid4().hex[:16]}",
+            "user_id": user_id,
+            "data": msg_data,
+            "created_at": created_at + timedelta(microseconds=position),
+        }
+        for position, msg_data in enumerate(messages)
+    ]
+    statement = (
+        insert(Message)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["chat_id", "message_id"])
+    )
+    await session.exec(statement)
+    await session.commit()
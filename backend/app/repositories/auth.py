@@ -1,19 +1,71 @@
+from typing import Any, Dict, Optional
+
 from sqlmodel import select
 
-from app.config.db import SessionDep
+from app.config.db import SessionDep, new_session
+from app.config.settings import get_settings
 from app.models import User
+from app.utils.cache import TTLCache
+
+# In-process cache of user records for authentication, keyed on user id;
+# call `invalidate_user` whenever a user row changes
+user_cache: TTLCache[Dict[str, Any]] = TTLCache(
+    get_settings().AUTH_USER_CACHE_MAX_ENTRIES,
+    get_settings().AUTH_USER_CACHE_TTL_SECONDS,
+)
+
+
+def user_profile(user: User) -> Dict[str, Any]:
+    return {
+        "id": user.id,
+        "login": user.login,
+        "name": user.name,
+        "avatar_url": user.avatar_url,
+    }
+
+
+def invalidate_user(user_id: int) -> None:
+    user_cache.delete(str(user_id))
+
+
+async def get_user_profile(user_id: int) -> Optional[Dict[str, Any]]:
+    """Return the user's profile from the cache, or load it from the database."""
+    profile = user_cache.get(str(user_id))
+    if profile is not None:
+        return profile
+
+    async with new_session() as session:
+        user = await session.get(User, user_id)
+    if user is None:
+        return None
+
+    profile = user_profile(user)
+    user_cache.set(str(user_id), profile)
+    return profile
 
 
-def get_or_create_user(
+async def get_or_create_user(
     session: SessionDep,
     user_info: dict,
 ):
     # Check if user with this login already exists
     user_statement = select(User).where(User.github_id == user_info["id"])
-    user = session.exec(user_statement).first()
+    user = (await session.exec(user_statement)).first()
 
     if user:
-        # User exists
+        # User exists; keep the profile in sync with GitHub
+        changes = {
+            "login": user_info["login"],
+            "name": user_info.get("name"),
+            "avatar_url": user_info.get("avatar_url"),
+        }
+        if any(getattr(user, field) != value for field, value in changes.items()):
+            for field, value in changes.items():
+                setattr(user, field, value)
+            session.add(user)
+            await session.commit()
+            assert user.id is not None
+            invalidate_user(user.id)
         return user
 
     # Create new user
@@ -24,7 +76,7 @@ def get_or_create_user(
         github_id=user_info["id"],
     )
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
 
     return user
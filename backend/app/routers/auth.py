@@ -27,8 +27,15 @@ async def github_callback(request: Request, settings: SettingsDep, session: Sess
     resp.raise_for_status()
     user_info = resp.json()
 
-    user = get_or_create_user(session, user_info)
-    access_token = create_jwt(settings, str(user.id), JWT_ALG, JWT_EXP_MINUTES)
+    user = await get_or_create_user(session, user_info)
+    # Profile claims let authenticated requests skip the user lookup
+    access_token = create_jwt(
+        settings,
+        str(user.id),
+        JWT_ALG,
+        JWT_EXP_MINUTES,
+        {"login": user.login, "name": user.name, "avatar_url": user.avatar_url},
+    )
 
     resp = RedirectResponse(url=settings.FRONTEND_URL)
     set_jwt_cookie(resp, settings, access_token, JWT_EXP_MINUTES)
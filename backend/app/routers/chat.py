@@ -1,23 +1,39 @@
+import logging
 import uuid
 from typing import Any, List, Optional
 
-from fastapi import APIRouter, BackgroundTasks, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Header, HTTPException, Query, Response
 from fastapi.responses import StreamingResponse
 from openai import BaseModel
 
-from app.config import AVAILABLE_TOOLS, TOOL_DEFINITIONS
-from app.config.ai import OpenAIClientDep
+from app.config.admission import ChatAdmissionDep
+from app.config.ai import AVAILABLE_TOOLS, TOOL_DEFINITIONS, OpenAIClientDep
 from app.config.auth import UserDep
-from app.config.db import SessionDep
+from app.config.db import SessionDep, new_session
 from app.config.settings import SettingsDep
-from app.repositories.ai import create_chat, load_chat
+from app.models import Chat
+from app.repositories.ai import (
+    create_chat,
+    decode_cursor,
+    get_user_chat,
+    load_chat,
+    load_chat_page,
+)
 from app.schemas.ai import ClientMessage, ClientMessagePart
+from app.services.semantic_cache import semantic_answer_cache
+from app.services.summary import summary_message
 from app.utils.ai import (
     convert_to_openai_messages,
+    estimate_prompt_tokens,
     patch_response_with_headers,
     stream_text,
     stream_text_with_persistence,
+    window_messages,
 )
+from app.utils.resumable import parse_last_event_id, stream_registry
+from app.utils.stream import sse_stream
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
@@ -31,24 +47,41 @@ class ChatRequest(BaseModel):
 @router.post("")
 async def handle_chat_data(
     request: ChatRequest,
-    background_tasks: BackgroundTasks,
     settings: SettingsDep,
-    session: SessionDep,
     user: UserDep,
     client: OpenAIClientDep,
+    slot: ChatAdmissionDep,
     protocol=Query("data"),
 ):
     """Stream a message response from OpenAI, storing messages in database."""
     # Handle chat persistence
     chat_id = request.id
     previous_messages: List[dict[str, Any]] = []
+    chat: Optional[Chat] = None
+    # Only the opening question of a conversation may be answered from the
+    # semantic cache; later ones depend on the history before them
+    first_turn = True
 
     if chat_id:
-        # Load previous messages
+        # Load only the recent messages not covered by the chat's summary
+        # that fit the prompt's context window. The session is closed before
+        # streaming starts, so a long reply doesn't hold a pooled connection.
         try:
-            previous_messages = load_chat(session, chat_id, user.id)
+            async with new_session() as session:
+                chat = await get_user_chat(session, chat_id, user.id)
+                previous_messages = await load_chat(
+                    session,
+                    chat_id,
+                    user.id,
+                    settings.CHAT_CONTEXT_MAX_MESSAGES,
+                    chat.summary_until_id,
+                )
         except ValueError as e:
             raise HTTPException(status_code=404, detail=str(e))
+        first_turn = not previous_messages and not chat.summary
+        previous_messages = window_messages(
+            previous_messages, settings.CHAT_CONTEXT_MAX_TOKENS
+        )
         # Convert to ClientMessage format for processing
         client_messages = []
         for msg in previous_messages:
@@ -57,7 +90,9 @@ async def handle_chat_data(
             parts_data = msg.get("parts", [])
             content = ""
 
-            # Convert parts to ClientMessagePart objects
+            # Convert parts to ClientMessagePart objects; stored tool calls
+            # and outputs stay out of the prompt, the answers built on them
+            # are already in the text
             parts = []
             for part_data in parts_data:
                 if part_data.get("type") == "text":
@@ -80,6 +115,7 @@ async def handle_chat_data(
         # Use messages array directly
         if request.messages:
             messages = request.messages
+            first_turn = len(messages) == 1
         elif request.message:
             messages = [request.message]
         else:
@@ -87,18 +123,31 @@ async def handle_chat_data(
 
     openai_messages = convert_to_openai_messages(messages)
 
-    # Track messages for persistence if chat_id is provided
-    ui_messages = []
-    if chat_id:
-        # Convert client messages to UIMessage format for storage
-        # When loading from DB, messages already have IDs
-        if previous_messages:
-            ui_messages = previous_messages[:]
+    # Older turns reach the prompt as the chat's summary; report the estimated
+    # prompt size with the full history and with the summary instead
+    message_metadata = None
+    if chat is not None:
+        tokens_before = estimate_prompt_tokens(openai_messages)
+        if chat.summary:
+            openai_messages.insert(1, summary_message(chat.summary))  # type: ignore
+            tokens_before += chat.summary_source_tokens
+        message_metadata = {
+            "contextTokens": {
+                "beforeSummary": tokens_before,
+                "afterSummary": estimate_prompt_tokens(openai_messages),
+            }
+        }
+
+    semantic_cache = semantic_answer_cache if settings.SEMANTIC_CACHE_ENABLED else None
 
+    # Track the turn's new messages for persistence if chat_id is provided;
+    # earlier ones are already stored
+    new_messages = []
+    if chat_id:
         # Add the new user message if provided
         if request.message:
             msg_dict: dict[str, Any] = {
-                "id": f"msg-{uuid.uuid4().hex[:16]}",
+                "id": request.message.id or f"msg-{uuid.uuid4().hex[:16]}",
                 "role": request.message.role,
                 "parts": [],
             }
@@ -108,39 +157,93 @@ async def handle_chat_data(
                 ]  # type: ignore
             elif request.message.content:
                 msg_dict["parts"] = [{"type": "text", "text": request.message.content}]  # type: ignore
-            ui_messages.append(msg_dict)
+            new_messages.append(msg_dict)
 
-    # Create streaming response with callback to save messages
+    # Chats generate in a resumable stream: the reply is persisted once it
+    # ends, even if the client disconnected and never comes back
+    persist_tasks = BackgroundTasks()
     if chat_id:
-        response = StreamingResponse(
-            stream_text_with_persistence(
-                client,
-                openai_messages,
-                TOOL_DEFINITIONS,
-                AVAILABLE_TOOLS,
-                settings.OPENAI_MODEL,
-                protocol,
-                ui_messages,
-                chat_id,
-                user.id,
-                background_tasks,
-            ),
-            media_type="text/event-stream",
+        chunks = stream_text_with_persistence(
+            client,
+            openai_messages,
+            TOOL_DEFINITIONS,
+            AVAILABLE_TOOLS,
+            settings.OPENAI_MODEL,
+            protocol,
+            new_messages,
+            chat_id,
+            user.id,
+            persist_tasks,
+            semantic_cache,
+            message_metadata,
+            first_turn,
         )
     else:
         # No persistence, just stream
-        response = StreamingResponse(
-            stream_text(
-                client,
-                openai_messages,
-                TOOL_DEFINITIONS,
-                AVAILABLE_TOOLS,
-                settings.OPENAI_MODEL,
-                protocol,
-            ),
-            media_type="text/event-stream",
+        chunks = stream_text(
+            client,
+            openai_messages,
+            TOOL_DEFINITIONS,
+            AVAILABLE_TOOLS,
+            settings.OPENAI_MODEL,
+            protocol,
+            semantic_cache,
+            first_turn=first_turn,
         )
 
+    events = sse_stream(
+        chunks,
+        settings.STREAM_COALESCE_MAX_DELAY_SECONDS,
+        settings.STREAM_COALESCE_MAX_CHARS,
+    )
+    if not chat_id:
+        # Without a chat there is nothing to resume: stream straight through
+        response = StreamingResponse(slot.wrap(events), media_type="text/event-stream")
+        return patch_response_with_headers(response, protocol)
+
+    stream = stream_registry.start(events, user.id, chat_id, persist_tasks)
+    # The admission slot is held until the last event, not the response, and
+    # is free again before the reply is persisted and the summary updated
+    slot.bind(stream.add_close_callback)
+    response = StreamingResponse(stream.subscribe(), media_type="text/event-stream")
+    return patch_response_with_headers(response, protocol)
+
+
+@router.get("/{chat_id}/stream")
+async def resume_chat_stream(
+    user: UserDep,
+    chat_id: str,
+    protocol=Query("data"),
+    last_event_id: Optional[str] = Header(None),
+):
+    """Resume the chat's stream after `Last-Event-ID`, or replay its running one.
+
+    Returns 204 when there is nothing to resume (without `Last-Event-ID`, a
+    finished stream is already in the chat history), and 410 when the events
+    after `Last-Event-ID` were already evicted.
+    """
+    stream = stream_registry.latest_for_chat(chat_id, user.id)
+    if stream is not None and stream.done:
+        stream = None
+    last_sequence = -1
+    if last_event_id:
+        try:
+            stream_id, last_sequence = parse_last_event_id(last_event_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        stream = stream_registry.get(stream_id, user.id)
+        if stream is not None and stream.chat_id != chat_id:
+            stream = None
+
+    if stream is None:
+        return Response(status_code=204)
+    if not stream.can_resume(last_sequence):
+        raise HTTPException(status_code=410, detail="Stream events expired")
+
+    stream_registry.record_resume()
+    response = StreamingResponse(
+        stream.subscribe(last_sequence), media_type="text/event-stream"
+    )
     return patch_response_with_headers(response, protocol)
 
 
@@ -154,25 +257,53 @@ async def create_new_chat(
     user: UserDep,
 ):
     """Create a new chat and return its ID."""
-    print(f"---- Creating new chat for user {user.id}")
-    chat_id = create_chat(session, user.id)
+    logger.debug("Creating new chat for user %s", user.id)
+    chat_id = await create_chat(session, user.id)
     return CreateNewChatResponse(id=chat_id)
 
 
 class GetChatMessagesResponse(BaseModel):
     id: str
     messages: List[dict[str, Any]]
+    next_cursor: Optional[str] = None  # Pass as `before` to load older messages
 
 
 @router.get("/{chat_id}", response_model=GetChatMessagesResponse)
 async def get_chat_messages(
     session: SessionDep,
+    settings: SettingsDep,
     user: UserDep,
     chat_id: str,
+    limit: Optional[int] = Query(None, ge=1),
+    before: Optional[str] = None,
 ):
-    """Load chat messages by chat ID."""
+    """Load chat messages by chat ID.
+
+    Without `limit` or `before`, the whole history is returned. With either,
+    one page is returned, most recent first; follow `next_cursor` for older
+    messages.
+    """
+    if limit is None and before is None:
+        try:
+            messages = await load_chat(session, chat_id, user.id)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        return GetChatMessagesResponse(id=chat_id, messages=messages)
+
+    page_size = min(
+        limit or settings.CHAT_HISTORY_PAGE_SIZE, settings.CHAT_HISTORY_MAX_PAGE_SIZE
+    )
     try:
-        messages = load_chat(session, chat_id, user.id)
+        cursor = decode_cursor(before) if before else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        messages, next_cursor = await load_chat_page(
+            session, chat_id, user.id, page_size, cursor
+        )
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
-    return GetChatMessagesResponse(id=chat_id, messages=messages)
+    return GetChatMessagesResponse(
+        id=chat_id, messages=messages, next_cursor=next_cursor
+    )
@@ -1,4 +1,6 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
+
+from app.services.rag import RagStatus, rag_state
 
 router = APIRouter(prefix="/health", tags=["health"])
 
@@ -6,3 +8,12 @@ router = APIRouter(prefix="/health", tags=["health"])
 @router.get("")
 def health():
     return {"status": "ok"}
+
+
+@router.get("/ready")
+def ready(response: Response):
+    """Readiness: ok only once the RAG index is loaded and searchable."""
+    is_ready = rag_state.status == RagStatus.READY
+    if not is_ready:
+        response.status_code = 503
+    return {"status": "ready" if is_ready else "not-ready", "rag": rag_state.snapshot()}
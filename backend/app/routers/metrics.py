@@ -0,0 +1,26 @@
+import secrets
+
+from fastapi import APIRouter, Header, HTTPException
+
+from app.config.settings import SettingsDep
+from app.utils.metrics import collect_metrics
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("")
+def metrics(settings: SettingsDep, authorization: str = Header("")):
+    """Internal metrics; disabled unless `METRICS_TOKEN` is configured."""
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(
+        token, settings.METRICS_TOKEN
+    ):
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return collect_metrics()
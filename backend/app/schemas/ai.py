@@ -41,6 +41,7 @@ class ClientMessagePart(BaseModel):
 
 
 class ClientMessage(BaseModel):
+    id: Optional[str] = None
     role: str
     content: Optional[str] = None
     parts: Optional[List[ClientMessagePart]] = None
@@ -0,0 +1,76 @@
+import mmap
+from typing import Iterator, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+# Formato do arquivo (little-endian):
+#   cabeçalho: MAGIC (8 bytes) + quantidade de chunks (u32) + reservado (u32)
+#   tabela:    um registro RECORD_DTYPE por chunk
+#   dados:     textos UTF-8 concatenados, localizados por (offset, length)
+MAGIC = b"EDCHUNK1"
+HEADER_SIZE = 16
+RECORD_DTYPE = np.dtype(
+    [("offset", "<u8"), ("length", "<u4"), ("page", "<i4"), ("start", "<i4")]
+)
+
+
+def write_chunk_store(path: str, documents: Sequence[Document]) -> None:
+    """Grava os chunks (texto, página e posição na página) num único arquivo."""
+    texts = [document.page_content.encode("utf-8") for document in documents]
+    records = np.zeros(len(documents), dtype=RECORD_DTYPE)
+
+    offset = HEADER_SIZE + records.nbytes
+    for i, (document, text) in enumerate(zip(documents, texts)):
+        records[i] = (
+            offset,
+            len(text),
+            document.metadata.get("page", -1),
+            document.metadata.get("start_index", -1),
+        )
+        offset += len(text)
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.array([len(documents), 0], dtype="<u4").tobytes())
+        f.write(records.tobytes())
+        for text in texts:
+            f.write(text)
+
+
+class ChunkStore:
+    """
+    Leitura dos chunks via mmap: a tabela de offsets é uma view numpy sobre o
+    arquivo e os textos só são decodificados quando pedidos. Vários workers
+    compartilham as mesmas páginas pelo cache do sistema operacional.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"Arquivo de chunks inválido: {path}")
+        count = int(
+            np.frombuffer(self._mmap, dtype="<u4", count=1, offset=len(MAGIC))[0]
+        )
+        self._records = np.frombuffer(
+            self._mmap, dtype=RECORD_DTYPE, count=count, offset=HEADER_SIZE
+        )
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[Document]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, i: int) -> Document:
+        offset, length, page, start = self._records[i].tolist()
+        text = self._mmap[offset : offset + length].decode("utf-8")
+        metadata = {"chunk_id": i}
+        if page >= 0:
+            metadata["page"] = page
+        if start >= 0:
+            metadata["start_index"] = start
+        return Document(page_content=text, metadata=metadata)
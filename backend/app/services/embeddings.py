@@ -0,0 +1,204 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_classic.embeddings import CacheBackedEmbeddings
+from langchain_classic.storage import LocalFileStore
+from langchain_core.embeddings import Embeddings
+from langchain_core.stores import ByteStore
+
+logger = logging.getLogger(__name__)
+
+
+class CountingByteStore(ByteStore):
+    """Repassa as operações para `store`, contando acertos e falhas de leitura."""
+
+    def __init__(self, store: ByteStore) -> None:
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        values = self.store.mget(keys)
+        hits = sum(value is not None for value in values)
+        self.hits += hits
+        self.misses += len(values) - hits
+        return values
+
+    def mset(self, key_value_pairs: Sequence[Tuple[str, bytes]]) -> None:
+        self.store.mset(key_value_pairs)
+
+    def mdelete(self, keys: Sequence[str]) -> None:
+        self.store.mdelete(keys)
+
+    def yield_keys(self, *, prefix: Optional[str] = None) -> Iterator[str]:
+        return self.store.yield_keys(prefix=prefix)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def cached_document_embeddings(
+    embeddings: Embeddings,
+    cache_dir: str,
+    model: str,
+) -> Tuple[CacheBackedEmbeddings, CountingByteStore]:
+    """
+    Envolve `embeddings` num cache em disco endereçado por conteúdo: a chave é
+    `model` + sha256(texto do chunk). Num rebuild (ex.: retificação do edital),
+    só os chunks que mudaram vão para a API de embeddings.
+    """
+    store = CountingByteStore(LocalFileStore(cache_dir))
+    cached = CacheBackedEmbeddings.from_bytes_store(
+        embeddings,
+        store,
+        namespace=model,
+        key_encoder="sha256",
+    )
+    return cached, store
+
+
+class PrecomputedEmbeddings(Embeddings):
+    """
+    Devolve vetores já conhecidos (texto -> vetor), sem chamar nenhuma API.
+    Passado a `cached_document_embeddings`, serve para semear o cache com
+    vetores vindos de outro índice.
+    """
+
+    def __init__(self, vectors: Dict[str, List[float]]) -> None:
+        self.vectors = vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.vectors[text]
+
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class QueryEmbeddingBatcher:
+    """
+    Junta os embeddings de queries pedidos quase ao mesmo tempo (por vários
+    usuários) numa única chamada a `embed_batch`. Uma thread despachante pega
+    o primeiro pedido da fila e espera até `max_wait_seconds` por outros, até
+    `max_batch_size` textos; quem pediu fica bloqueado só no próprio resultado.
+    Queries repetidas no mesmo lote são embedadas uma vez.
+
+    Cada lote vai para um pool de `max_in_flight` threads, então um lote lento
+    não atrasa o seguinte. Com todos os lotes em andamento, os pedidos novos
+    esperam na fila e saem juntos no próximo lote.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], List[List[float]]],
+        max_batch_size: int,
+        max_wait_seconds: float,
+        max_in_flight: int = 4,
+    ) -> None:
+        self.embed_batch = embed_batch
+        self.max_batch_size = max(max_batch_size, 1)
+        self.max_wait_seconds = max(max_wait_seconds, 0.0)
+        self.max_in_flight = max(max_in_flight, 1)
+        self._in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        self._executor = ThreadPoolExecutor(
+            self.max_in_flight, thread_name_prefix="query-embedding"
+        )
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.queries = 0
+        self.errors = 0
+        self._histogram = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+
+    def embed(self, text: str) -> List[float]:
+        """Embedding de `text` como query. Bloqueante (chame fora do event loop)."""
+        if self.max_batch_size == 1:
+            return self._embed_batch([text])[0]
+
+        future: "Future[List[float]]" = Future()
+        self._ensure_started()
+        self._queue.put((text, future))
+        return future.result()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            labels = [str(bound) for bound in BATCH_SIZE_BUCKETS] + ["+Inf"]
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_seconds": self.max_wait_seconds,
+                "max_in_flight": self.max_in_flight,
+                "batches": self.batches,
+                "queries": self.queries,
+                "errors": self.errors,
+                "mean_batch_size": self.queries / self.batches if self.batches else 0.0,
+                "batch_size_histogram": dict(zip(labels, self._histogram)),
+            }
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="query-embedding-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            # Só monta o próximo lote quando houver vaga para despachá-lo
+            self._in_flight.acquire()
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait_seconds
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._executor.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch: List[Tuple[str, "Future[List[float]]"]]) -> None:
+        try:
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = dict(zip(texts, self._embed_batch(texts)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                return
+
+            for text, future in batch:
+                future.set_result(vectors[text])
+        finally:
+            self._in_flight.release()
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        try:
+            vectors = self.embed_batch(texts)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+
+        with self._lock:
+            self.batches += 1
+            self.queries += len(texts)
+            bucket = next(
+                (
+                    i
+                    for i, bound in enumerate(BATCH_SIZE_BUCKETS)
+                    if len(texts) <= bound
+                ),
+                len(BATCH_SIZE_BUCKETS),
+            )
+            self._histogram[bucket] += 1
+        return vectors
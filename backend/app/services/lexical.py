@@ -0,0 +1,133 @@
+import json
+import re
+import unicodedata
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Palavras muito frequentes em perguntas sobre o edital que não ajudam a
+# distinguir trechos ("qual", "de", "da", ...)
+STOPWORDS = frozenset(
+    """
+    a o as os um uma uns umas de da do das dos em na no nas nos ao aos
+    e ou que qual quais quando onde como quem para por com sem se sua seu
+    suas seus é ser sao este esta isso isto ha mais muito me meu minha
+    """.split()
+)
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def strip_accents(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text: str) -> List[str]:
+    """Termos normalizados (minúsculos, sem acento, sem stopwords) de `text`."""
+    return [
+        token
+        for token in _TOKEN_RE.findall(strip_accents(text.casefold()))
+        if token not in STOPWORDS
+    ]
+
+
+class BM25Index:
+    """
+    Índice invertido BM25 sobre os chunks: para cada termo, os ids dos chunks
+    que o contêm e a frequência em cada um. A busca só visita as listas dos
+    termos da pergunta.
+    """
+
+    def __init__(
+        self,
+        postings: Dict[str, Tuple[np.ndarray, np.ndarray]],
+        doc_lengths: np.ndarray,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ) -> None:
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+
+    @classmethod
+    def build(cls, texts: Sequence[str]) -> "BM25Index":
+        term_docs: Dict[str, Dict[int, int]] = {}
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            for token in tokens:
+                frequencies = term_docs.setdefault(token, {})
+                frequencies[doc_id] = frequencies.get(doc_id, 0) + 1
+
+        postings = {
+            term: (
+                np.fromiter(frequencies.keys(), dtype=np.int32),
+                np.fromiter(frequencies.values(), dtype=np.float32),
+            )
+            for term, frequencies in term_docs.items()
+        }
+        return cls(postings, doc_lengths)
+
+    def save(self, path: str) -> None:
+        data = {
+            "k1": self.k1,
+            "b": self.b,
+            "doc_lengths": self.doc_lengths.astype(int).tolist(),
+            "postings": {
+                term: [ids.tolist(), frequencies.astype(int).tolist()]
+                for term, (ids, frequencies) in self.postings.items()
+            },
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        postings = {
+            term: (
+                np.asarray(ids, dtype=np.int32),
+                np.asarray(frequencies, dtype=np.float32),
+            )
+            for term, (ids, frequencies) in data["postings"].items()
+        }
+        doc_lengths = np.asarray(data["doc_lengths"], dtype=np.float32)
+        return cls(postings, doc_lengths, data["k1"], data["b"])
+
+    def search(self, query: str, k: int) -> List[int]:
+        """Ids dos `k` chunks com maior score BM25 (só os que têm algum termo)."""
+        scores = np.zeros(len(self.doc_lengths), dtype=np.float32)
+        total_docs = len(self.doc_lengths)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            ids, frequencies = self.postings[term]
+            idf = np.log(1 + (total_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            length_norm = (
+                1 - self.b + self.b * self.doc_lengths[ids] / self.avg_doc_length
+            )
+            scores[ids] += (
+                idf
+                * frequencies
+                * (self.k1 + 1)
+                / (frequencies + self.k1 * length_norm)
+            )
+
+        matched = np.flatnonzero(scores)
+        best = matched[np.argsort(-scores[matched], kind="stable")[:k]]
+        return best.tolist()
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[int]:
+    """Funde listas ranqueadas de ids: score(id) = soma de 1 / (k + posição)."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda doc_id: scores[doc_id], reverse=True)
@@ -0,0 +1,105 @@
+from typing import Any, Dict, List, Sequence
+
+from langchain_core.documents import Document
+
+from app.utils.tokens import estimate_tokens
+
+# Chunks da mesma página separados por até isso (espaço removido pelo
+# splitter) ainda contam como vizinhos e são unidos
+MAX_MERGE_GAP = 2
+
+
+def merge_chunks(documents: Sequence[Document]) -> List[Document]:
+    """
+    Une chunks da mesma página que se sobrepõem (o splitter repete 200
+    caracteres entre vizinhos) ou que se encostam, usando `page` e
+    `start_index`. O texto repetido aparece uma vez só. A ordem de entrada é
+    a de relevância; cada bloco fica na posição do seu melhor chunk.
+    """
+    blocks: List[Dict[str, Any]] = []
+    by_page: Dict[Any, List[Any]] = {}
+    for rank, document in enumerate(documents):
+        page = document.metadata.get("page")
+        start = document.metadata.get("start_index")
+        if page is None or start is None:
+            blocks.append(_block(rank, document, start))
+        else:
+            by_page.setdefault(page, []).append((start, rank, document))
+
+    for spans in by_page.values():
+        spans.sort(key=lambda span: span[0])
+        current = None
+        for start, rank, document in spans:
+            if current is not None and start <= current["end"] + MAX_MERGE_GAP:
+                text = document.page_content
+                if start > current["end"]:
+                    current["text"] += " " + text
+                elif start + len(text) > current["end"]:
+                    current["text"] += text[current["end"] - start :]
+                current["end"] = max(current["end"], start + len(text))
+                current["rank"] = min(current["rank"], rank)
+                current["score"] = max(current["score"], _score(document))
+                current["chunk_ids"].append(document.metadata.get("chunk_id"))
+            else:
+                current = _block(rank, document, start)
+                blocks.append(current)
+
+    blocks.sort(key=lambda block: block["rank"])
+    merged = []
+    for block in blocks:
+        metadata = {
+            "chunk_ids": block["chunk_ids"],
+            "relevance_score": block["score"],
+        }
+        if block["page"] is not None:
+            metadata["page"] = block["page"]
+        if block["start"] is not None:
+            metadata["start_index"] = block["start"]
+        merged.append(Document(page_content=block["text"], metadata=metadata))
+    return merged
+
+
+def pack_context(
+    documents: Sequence[Document],
+    max_tokens: int,
+    min_score_ratio: float,
+) -> List[Document]:
+    """
+    Escolhe, em ordem de relevância, os chunks que cabem em `max_tokens`
+    (contados depois de unir os vizinhos, então sobreposições não pesam duas
+    vezes). Chunks com score abaixo de `min_score_ratio` x o melhor score são
+    descartados. O chunk mais relevante sempre entra; `max_tokens` <= 0
+    desliga o orçamento.
+    """
+    if not documents:
+        return []
+
+    best_score = max(_score(document) for document in documents)
+    selected: List[Document] = []
+    for document in documents:
+        if best_score > 0 and _score(document) < best_score * min_score_ratio:
+            continue
+
+        packed = merge_chunks([*selected, document])
+        tokens = sum(estimate_tokens(block.page_content) for block in packed)
+        if selected and 0 < max_tokens < tokens:
+            continue
+        selected.append(document)
+
+    return merge_chunks(selected)
+
+
+def _score(document: Document) -> float:
+    return float(document.metadata.get("relevance_score", 0.0))
+
+
+def _block(rank: int, document: Document, start: Any) -> Dict[str, Any]:
+    return {
+        "rank": rank,
+        "page": document.metadata.get("page"),
+        "start": start,
+        "end": (start or 0) + len(document.page_content),
+        "text": document.page_content,
+        "score": _score(document),
+        "chunk_ids": [document.metadata.get("chunk_id")],
+    }
@@ -1,18 +1,41 @@
+import argparse
+import asyncio
+import fcntl
+import hashlib
+import json
 import os
 import logging
+import pickle
+import shutil
+import statistics
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
 
 # LangChain Imports
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
 from langchain_cohere import CohereEmbeddings
-from langchain_classic.retrievers.contextual_compression import ContextualCompressionRetriever
-from langchain_cohere import CohereRerank
+from langchain_core.documents import Document
+import faiss
+import numpy as np
 
-from dotenv import load_dotenv
-
-# Carrega variáveis de ambiente
-load_dotenv()
+from app.config.settings import get_settings
+from app.services.chunk_store import ChunkStore, write_chunk_store
+from app.services.embeddings import (
+    PrecomputedEmbeddings,
+    QueryEmbeddingBatcher,
+    cached_document_embeddings,
+)
+from app.services.lexical import BM25Index, reciprocal_rank_fusion
+from app.services.packing import pack_context
+from app.services.rerank import CohereReranker, LocalReranker, Reranker
+from app.utils.cache import RedisCacheStore, TTLCache
 
 # Configuração de Logging
 logger = logging.getLogger(__name__)
@@ -24,100 +47,559 @@ PERSIST_DIR = os.path.join(SCRIPT_DIR, "..", "..", "storage")
 DATA_DIR = os.path.join(SCRIPT_DIR, "..", "..", "data")
 PDF_PATH = os.path.join(DATA_DIR, "edital_unicamp.pdf")
 
+# Cada build gera storage/versions/<versão>/ (index.faiss, chunks.bin, bm25.json,
+# manifest.json)
+# e o arquivo storage/CURRENT aponta para a versão ativa.
+VERSIONS_DIR = os.path.join(PERSIST_DIR, "versions")
+CURRENT_FILE = os.path.join(PERSIST_DIR, "CURRENT")
+MANIFEST_FILE = "manifest.json"
+FAISS_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.bin"
+BM25_FILE = "bm25.json"
+# Versões com outro formato (ex.: docstore em pickle) são recriadas
+INDEX_FORMAT = 2
+# Cache de embeddings dos chunks, compartilhado entre builds
+EMBEDDING_CACHE_DIR = os.path.join(PERSIST_DIR, "embedding_cache")
+# Trava entre processos: só um worker (ou o CLI) cria versões por vez
+BUILD_LOCK_FILE = os.path.join(PERSIST_DIR, ".build.lock")
+# Índice de antes do versionamento (FAISS.save_local do LangChain)
+LEGACY_FAISS_FILE = os.path.join(PERSIST_DIR, "index.faiss")
+LEGACY_DOCSTORE_FILE = os.path.join(PERSIST_DIR, "index.pkl")
+
+# Parâmetros do pipeline (registrados no manifest de cada versão)
+EMBEDDING_MODEL = "embed-v4.0"  # ou embed-multilingual-v3.0
+RERANK_MODEL = "rerank-multilingual-v3.0"  # Modelo mais recente e multilíngue
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 200
+CHUNK_SEPARATORS = ["\n\n", "\n", " ", ""]
+
+
 # --- 2. Configuração do Modelo de Embedding (Cohere) ---
-if not os.getenv("COHERE_API_KEY"):
-    logger.error("COHERE_API_KEY não encontrada no .env!")
+@lru_cache
+def get_embeddings() -> CohereEmbeddings:
+    """Cria o cliente de embeddings sob demanda (nada de rede no import)."""
+    settings = get_settings()
+    if not settings.COHERE_API_KEY:
+        logger.error("COHERE_API_KEY não encontrada no .env!")
 
-embeddings = CohereEmbeddings(
-    model="embed-v4.0", # ou embed-multilingual-v3.0
-    cohere_api_key=os.getenv("COHERE_API_KEY")
-)
+    return CohereEmbeddings(
+        model=EMBEDDING_MODEL,
+        cohere_api_key=settings.COHERE_API_KEY or None,
+    )
 
-# --- 3. Carregamento Imediato (Eager Loading) ---
-
-try:
-    # Verifica se o índice FAISS já existe na pasta storage
-    # O FAISS salva arquivos como index.faiss e index.pkl
-    if not os.path.exists(os.path.join(PERSIST_DIR, "index.faiss")):
-        logger.info("Índice FAISS não encontrado. Criando novo...")
-        
-        # 1. Carregar o PDF
-        if os.path.exists(PDF_PATH):
-            logger.info(f"Carregando PDF: {PDF_PATH}")
-            loader = PyPDFLoader(PDF_PATH)
-            raw_documents = loader.load()
-        else:
-            logger.warning(f"PDF não encontrado em {PDF_PATH}. Criando índice vazio.")
-            raw_documents = []
-
-        if raw_documents:
-            # 2. Quebrar o texto (Chunking)
-            # O LangChain precisa disso explícito, diferente do LlamaIndex
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=800,
-                chunk_overlap=200,
-                separators=["\n\n", "\n", " ", ""]
-            )
-            documents = text_splitter.split_documents(raw_documents)
-            logger.info(f"Documento dividido em {len(documents)} pedaços (chunks).")
-
-            # 3. Criar Vetores e Indexar (FAISS)
-            vectorstore = FAISS.from_documents(documents, embeddings)
-            
-            # 4. Salvar no disco
-            os.makedirs(PERSIST_DIR, exist_ok=True)
-            vectorstore.save_local(PERSIST_DIR)
-            logger.info(f"Índice salvo em: {PERSIST_DIR}")
+
+@lru_cache
+def get_query_batcher() -> QueryEmbeddingBatcher:
+    """Lote compartilhado de embeddings de queries (buscas concorrentes)."""
+    settings = get_settings()
+    return QueryEmbeddingBatcher(
+        lambda texts: get_embeddings().embed(texts, input_type="search_query"),
+        settings.RAG_EMBED_BATCH_MAX_SIZE,
+        settings.RAG_EMBED_BATCH_MAX_WAIT_SECONDS,
+        settings.RAG_EMBED_BATCH_MAX_IN_FLIGHT,
+    )
+
+
+# --- 3. Build Offline de Versões do Índice ---
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_current_version() -> Optional[str]:
+    """Lê a versão ativa apontada por storage/CURRENT (None se não houver)."""
+    try:
+        with open(CURRENT_FILE, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def activate_version(version: str) -> None:
+    """Aponta storage/CURRENT para `version` de forma atômica (os.replace)."""
+    if not os.path.exists(os.path.join(VERSIONS_DIR, version, MANIFEST_FILE)):
+        raise ValueError(f"Versão do índice não encontrada: {version}")
+
+    tmp_path = f"{CURRENT_FILE}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, CURRENT_FILE)
+    logger.info(f"Versão ativa do índice: {version}")
+
+
+def read_manifest(version: str) -> Dict[str, Any]:
+    with open(
+        os.path.join(VERSIONS_DIR, version, MANIFEST_FILE), encoding="utf-8"
+    ) as f:
+        return json.load(f)
+
+
+def list_versions() -> List[Dict[str, Any]]:
+    if not os.path.isdir(VERSIONS_DIR):
+        return []
+
+    manifests = []
+    for name in sorted(os.listdir(VERSIONS_DIR)):
+        if os.path.exists(os.path.join(VERSIONS_DIR, name, MANIFEST_FILE)):
+            manifests.append(read_manifest(name))
+    return manifests
+
+
+def build_index_version(pdf_path: str = PDF_PATH, activate: bool = True) -> str:
+    """
+    Gera uma nova versão do índice a partir do PDF e devolve seu identificador.
+    A versão é escrita num diretório temporário e só então renomeada, então
+    um servidor nunca enxerga uma versão pela metade.
+    """
+    if not os.path.exists(pdf_path):
+        raise FileNotFoundError(f"PDF não encontrado em {pdf_path}")
+
+    pdf_hash = file_sha256(pdf_path)
+    created_at = datetime.now(timezone.utc)
+    version = f"{created_at.strftime('%Y%m%dT%H%M%SZ')}-{pdf_hash[:8]}"
+
+    # 1. Carregar o PDF
+    logger.info(f"Carregando PDF: {pdf_path}")
+    raw_documents = PyPDFLoader(pdf_path).load()
+
+    # 2. Quebrar o texto (Chunking)
+    # O LangChain precisa disso explícito, diferente do LlamaIndex
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        separators=CHUNK_SEPARATORS,
+        add_start_index=True,
+    )
+    documents = text_splitter.split_documents(raw_documents)
+    logger.info(f"Documento dividido em {len(documents)} pedaços (chunks).")
+    if not documents:
+        raise ValueError(f"Nenhum texto extraído de {pdf_path}")
+
+    # 3. Criar Vetores e Indexar (FAISS)
+    # Só os chunks que não estão no cache de embeddings vão para a Cohere
+    embeddings, embedding_cache = cached_document_embeddings(
+        get_embeddings(), EMBEDDING_CACHE_DIR, EMBEDDING_MODEL
+    )
+    vectors = np.asarray(
+        embeddings.embed_documents([document.page_content for document in documents]),
+        dtype=np.float32,
+    )
+    faiss_index = faiss.IndexFlatL2(vectors.shape[1])
+    faiss_index.add(vectors)
+    logger.info(
+        f"Cache de embeddings: {embedding_cache.hits} acertos, "
+        f"{embedding_cache.misses} falhas."
+    )
+
+    # 4. Salvar no disco (diretório temporário + rename atômico)
+    # Sem pickle: vetores no formato nativo do FAISS e chunks num arquivo
+    # binário com tabela de offsets, ambos abertos via mmap no servidor.
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    tmp_dir = os.path.join(VERSIONS_DIR, f".tmp-{version}")
+    os.makedirs(tmp_dir)
+    faiss.write_index(faiss_index, os.path.join(tmp_dir, FAISS_FILE))
+    write_chunk_store(os.path.join(tmp_dir, CHUNKS_FILE), documents)
+    # Índice lexical (BM25) ao lado do vetorial, com os mesmos ids de chunk
+    BM25Index.build([document.page_content for document in documents]).save(
+        os.path.join(tmp_dir, BM25_FILE)
+    )
+
+    manifest = {
+        "version": version,
+        "format": INDEX_FORMAT,
+        "created_at": created_at.isoformat(),
+        "pdf": {
+            "path": os.path.basename(pdf_path),
+            "sha256": pdf_hash,
+            "pages": len(raw_documents),
+        },
+        "chunking": {
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP,
+            "separators": CHUNK_SEPARATORS,
+        },
+        "embedding_model": EMBEDDING_MODEL,
+        "embedding_cache": embedding_cache.stats(),
+        "chunks": len(documents),
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    version_dir = os.path.join(VERSIONS_DIR, version)
+    if os.path.exists(version_dir):
+        shutil.rmtree(tmp_dir)
+        raise FileExistsError(f"Versão já existe: {version}")
+    os.rename(tmp_dir, version_dir)
+    logger.info(f"Índice salvo em: {version_dir}")
+
+    if activate:
+        activate_version(version)
+    return version
+
+
+@contextmanager
+def build_lock() -> Iterator[None]:
+    """Trava exclusiva (flock) entre os processos que criam versões do índice."""
+    os.makedirs(PERSIST_DIR, exist_ok=True)
+    with open(BUILD_LOCK_FILE, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def import_legacy_embeddings() -> int:
+    """
+    Copia para o cache de embeddings os vetores do índice de antes do
+    versionamento (storage/index.faiss + index.pkl), para que o primeiro build
+    não pague de novo à Cohere pelos mesmos chunks. Devolve quantos textos
+    foram importados (0 se não houver índice antigo).
+    """
+    if not (os.path.exists(LEGACY_FAISS_FILE) and os.path.exists(LEGACY_DOCSTORE_FILE)):
+        return 0
+
+    # Pickle local e confiável: escrito pelo próprio servidor antigo
+    with open(LEGACY_DOCSTORE_FILE, "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    legacy_index = faiss.read_index(LEGACY_FAISS_FILE)
+    vectors = legacy_index.reconstruct_n(0, legacy_index.ntotal)
+
+    known: Dict[str, List[float]] = {}
+    for position, doc_id in index_to_docstore_id.items():
+        document = docstore.search(doc_id)
+        if isinstance(document, Document):
+            known[document.page_content] = vectors[position].tolist()
+
+    # Mesmo modelo e mesmo chunking: as chaves batem com as do build
+    embeddings, _ = cached_document_embeddings(
+        PrecomputedEmbeddings(known), EMBEDDING_CACHE_DIR, EMBEDDING_MODEL
+    )
+    embeddings.embed_documents(list(known))
+    logger.info(f"{len(known)} embeddings importados do índice antigo.")
+    return len(known)
+
+
+def needs_build(version: Optional[str]) -> bool:
+    return version is None or read_manifest(version).get("format") != INDEX_FORMAT
+
+
+def ensure_index_version() -> str:
+    """
+    Devolve a versão ativa, criando-a antes se não houver (ou se estiver em
+    formato antigo). Vários workers subindo juntos criam uma versão só: os
+    outros esperam a trava e usam a que o primeiro ativou.
+    """
+    version = read_current_version()
+    if not needs_build(version):
+        return version  # type: ignore[return-value]
+
+    with build_lock():
+        # Outro processo pode ter criado a versão enquanto esperávamos
+        version = read_current_version()
+        if not needs_build(version):
+            return version  # type: ignore[return-value]
+
+        if version is None:
+            logger.info("Nenhuma versão do índice ativa. Criando a primeira...")
+            import_legacy_embeddings()
         else:
-            # Cria índice vazio para não quebrar
-            vectorstore = FAISS.from_texts([" "], embeddings)
-            
-    else:
-        logger.info("Carregando índice FAISS existente do disco...")
-        # allow_dangerous_deserialization é necessário para carregar arquivos pickle locais confiáveis
-        vectorstore = FAISS.load_local(
-            PERSIST_DIR, 
-            embeddings, 
-            allow_dangerous_deserialization=True
+            logger.info(f"Versão {version} em formato antigo. Recriando o índice...")
+        return build_index_version()
+
+
+# --- 4. Estado do Índice (Carregamento Preguiçoso + Hot-Swap) ---
+class RagStatus(str, Enum):
+    PENDING = "pending"
+    LOADING = "loading"
+    READY = "ready"
+    FAILED = "failed"
+
+
+class RagIndex:
+    """Uma versão carregada do índice: imutável depois de publicada."""
+
+    def __init__(
+        self,
+        version: str,
+        manifest: Dict[str, Any],
+        faiss_index: faiss.Index,
+        chunks: ChunkStore,
+        bm25: Optional[BM25Index],
+        reranker: Reranker,
+    ) -> None:
+        self.version = version
+        self.manifest = manifest
+        self.faiss_index = faiss_index
+        self.chunks = chunks
+        self.bm25 = bm25
+        self.reranker = reranker
+        self.loaded_at = datetime.now(timezone.utc)
+
+
+class RagState:
+    """
+    Estado compartilhado do RAG. A troca de versão é a atribuição de `index`:
+    cada busca lê a referência uma única vez, então requisições em andamento
+    terminam na versão antiga e as novas já usam a nova, sem intervalo.
+    """
+
+    def __init__(self) -> None:
+        self.status = RagStatus.PENDING
+        self.index: Optional[RagIndex] = None
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> Dict[str, Any]:
+        index = self.index
+        return {
+            "status": self.status.value,
+            "error": self.error,
+            "version": index.version if index else None,
+            "loaded_at": index.loaded_at.isoformat() if index else None,
+            "chunks": index.manifest.get("chunks") if index else None,
+        }
+
+
+rag_state = RagState()
+
+
+def build_reranker(kind: Optional[str] = None) -> Reranker:
+    # "O Filtro Inteligente": reordena os candidatos e pega apenas os top_n
+    # mais relevantes, na Cohere (padrão) ou localmente em CPU.
+    settings = get_settings()
+    kind = kind or settings.RAG_RERANKER
+    if kind == "local":
+        return LocalReranker(
+            settings.RAG_RERANK_TOP_N, settings.RAG_LOCAL_RERANK_LEXICAL_WEIGHT
         )
+    return CohereReranker(
+        settings.COHERE_API_KEY or None, RERANK_MODEL, settings.RAG_RERANK_TOP_N
+    )
+
 
-    # Cria o "retriever" (o objeto de busca) com Rerank
-    # 1. Base Retriever: "Rede de Pesca Larga"
-    # Aumentamos k para garantir que o chunk relevante seja capturado.
-    base_retriever = vectorstore.as_retriever(search_kwargs={"k": 20})
+def load_index_version(version: str) -> RagIndex:
+    version_dir = os.path.join(VERSIONS_DIR, version)
+    manifest = read_manifest(version)
 
-    # 2. Compressor: "O Filtro Inteligente"
-    # A Cohere reordena os 20 e pega apenas os top_n mais relevantes.
-    compressor = CohereRerank(
-        cohere_api_key=os.getenv("COHERE_API_KEY"),
-        model="rerank-multilingual-v3.0", # Modelo mais recente e multilíngue
-        top_n=4 
+    if manifest.get("format") != INDEX_FORMAT:
+        raise ValueError(f"Versão {version} está num formato antigo; gere uma nova")
+
+    logger.info(f"Carregando índice FAISS {version} do disco (mmap)...")
+    # MMAP_IFC mapeia também os vetores de um IndexFlat; com IO_FLAG_MMAP eles
+    # seriam copiados para a memória de cada worker
+    faiss_index = faiss.read_index(
+        os.path.join(version_dir, FAISS_FILE), faiss.IO_FLAG_MMAP_IFC
+    )
+    chunks = ChunkStore(os.path.join(version_dir, CHUNKS_FILE))
+    # Versões anteriores ao BM25 continuam funcionando só com a busca vetorial
+    bm25_path = os.path.join(version_dir, BM25_FILE)
+    bm25 = BM25Index.load(bm25_path) if os.path.exists(bm25_path) else None
+    return RagIndex(version, manifest, faiss_index, chunks, bm25, build_reranker())
+
+
+def vector_search(index: RagIndex, embedding: List[float], k: int) -> List[int]:
+    query = np.asarray([embedding], dtype=np.float32)
+    _, ids = index.faiss_index.search(query, min(k, index.faiss_index.ntotal))
+    return [int(i) for i in ids[0] if i >= 0]
+
+
+def retrieve_candidates(
+    index: RagIndex, query: str, embedding: List[float]
+) -> List[Document]:
+    """
+    Busca híbrida: a vetorial perde chunks de listas/tabelas que a lexical
+    acha por termos exatos (códigos de curso, datas). As duas listas são
+    fundidas por Reciprocal Rank Fusion antes do rerank.
+    """
+    settings = get_settings()
+    ids = vector_search(index, embedding, settings.RAG_VECTOR_K)
+    if index.bm25 is not None:
+        lexical_ids = index.bm25.search(query, settings.RAG_BM25_K)
+        ids = reciprocal_rank_fusion([ids, lexical_ids], settings.RAG_RRF_K)
+    return [index.chunks[i] for i in ids[: settings.RAG_RERANK_CANDIDATES]]
+
+
+def rerank_candidates(
+    index: RagIndex,
+    reranker: Reranker,
+    query: str,
+    embedding: List[float],
+    candidates: List[Document],
+) -> List[Document]:
+    # Os vetores dos candidatos saem do próprio índice FAISS (sem nova chamada
+    # de embedding), para rerankers locais que pontuam por similaridade
+    ids = np.asarray([candidate.metadata["chunk_id"] for candidate in candidates])
+    candidate_vectors = (
+        index.faiss_index.reconstruct_batch(ids)
+        if len(ids)
+        else np.zeros((0, index.faiss_index.d), dtype=np.float32)
     )
+    return reranker.rerank(
+        query, np.asarray(embedding, dtype=np.float32), candidates, candidate_vectors
+    )
+
+
+def initialize_rag() -> None:
+    """
+    Carrega a versão ativa do índice (criando a primeira, se não houver) e
+    publica em `rag_state`. É bloqueante: rode fora do event loop.
+    """
+    with rag_state._lock:
+        if rag_state.status in (RagStatus.LOADING, RagStatus.READY):
+            return
+        rag_state.status = RagStatus.LOADING
+        rag_state.error = None
+
+    try:
+        version = ensure_index_version()
+        rag_state.index = load_index_version(version)
+        rag_state.status = RagStatus.READY
+        logger.info(f"RAG pronto para consultas (versão {version}).")
+
+    except Exception as e:
+        logger.error(
+            f"Falha crítica ao inicializar RAG com LangChain: {e}", exc_info=True
+        )
+        rag_state.error = str(e)
+        rag_state.status = RagStatus.FAILED
+
+
+def reload_rag_if_changed() -> bool:
+    """Troca para a versão apontada por CURRENT se ela mudou. Bloqueante."""
+    version = read_current_version()
+    current = rag_state.index
+    if version is None or (current is not None and current.version == version):
+        return False
+
+    try:
+        new_index = load_index_version(version)
+    except Exception as e:
+        # Mantém a versão anterior servindo se a nova não carregar
+        logger.error(
+            f"Falha ao carregar a versão {version} do índice: {e}", exc_info=True
+        )
+        return False
+
+    rag_state.index = new_index
+    rag_state.status = RagStatus.READY
+    rag_state.error = None
+    # As chaves já incluem versão/modelo; limpar só libera memória
+    query_embedding_cache.clear()
+    retrieval_cache.clear()
+    logger.info(f"Índice trocado para a versão {version}.")
+    return True
+
+
+async def run_rag_loader(reload_interval: float) -> None:
+    """Inicializa o RAG e, se `reload_interval` > 0, observa CURRENT para hot-swap."""
+    await asyncio.to_thread(initialize_rag)
+    if reload_interval <= 0:
+        return
 
-    # 3. Pipeline Final
-    retriever_instance = ContextualCompressionRetriever(
-        base_compressor=compressor,
-        base_retriever=base_retriever
+    while True:
+        await asyncio.sleep(reload_interval)
+        await asyncio.to_thread(reload_rag_if_changed)
+
+
+# --- 5. Caches de Consulta ---
+# Candidatos repetem as mesmas perguntas ("data da prova", "taxa de inscrição")
+# milhares de vezes: guardamos o embedding da query e o contexto final já
+# reordenado, com LRU + TTL em memória e, opcionalmente, Redis compartilhado.
+def _shared_cache_store(prefix: str) -> Optional[RedisCacheStore]:
+    # Só configura: a conexão (e o import do redis) acontece no primeiro uso
+    settings = get_settings()
+    if not settings.RAG_CACHE_REDIS_URL:
+        return None
+    return RedisCacheStore(
+        settings.RAG_CACHE_REDIS_URL, prefix, settings.RAG_CACHE_REDIS_TIMEOUT_SECONDS
     )
 
-except Exception as e:
-    logger.error(f"Falha crítica ao inicializar RAG com LangChain: {e}", exc_info=True)
-    retriever_instance = None
+
+query_embedding_cache: TTLCache[List[float]] = TTLCache(
+    get_settings().RAG_QUERY_CACHE_MAX_ENTRIES,
+    get_settings().RAG_QUERY_CACHE_TTL_SECONDS,
+    _shared_cache_store("rag:embedding:"),
+)
+retrieval_cache: TTLCache[str] = TTLCache(
+    get_settings().RAG_QUERY_CACHE_MAX_ENTRIES,
+    get_settings().RAG_QUERY_CACHE_TTL_SECONDS,
+    _shared_cache_store("rag:context:"),
+)
+
+
+def normalize_query(query: str) -> str:
+    """Forma canônica da query usada como chave ("Data da prova?" == "data da  prova")."""
+    text = unicodedata.normalize("NFKC", query).casefold()
+    return " ".join(text.split()).strip(" ?!.")
+
+
+def embed_query(query: str, model: str) -> List[float]:
+    key = f"{model}:{normalize_query(query)}"
+    embedding = query_embedding_cache.get(key)
+    if embedding is None:
+        embedding = get_query_batcher().embed(query)
+        query_embedding_cache.set(key, embedding)
+    return embedding
 
 
-# --- 4. A Ferramenta ---
+def rag_metrics() -> Dict[str, Any]:
+    return {
+        "index": rag_state.snapshot(),
+        "query_embedding_cache": query_embedding_cache.stats(),
+        "query_embedding_batches": get_query_batcher().stats(),
+        "retrieval_cache": retrieval_cache.stats(),
+    }
+
+
+# --- 6. A Ferramenta ---
 def search_edital(query: str) -> str:
     """
     Busca no edital da Unicamp usando o retriever RAG configurado.
     """
     logger.info(f"Executando busca RAG para a query: '{query}'")
+    index = rag_state.index
+    if index is None:
+        logger.warning(
+            f"RAG indisponível ({rag_state.status.value}) para a query: '{query}'"
+        )
+        return "O índice do edital ainda não está disponível. Tente novamente em instantes."
+
+    # A chave inclui a versão: trocar o índice invalida o cache automaticamente
+    cache_key = f"{index.version}:{normalize_query(query)}"
+    cached_context = retrieval_cache.get(cache_key)
+    if cached_context is not None:
+        logger.info(f"Contexto em cache para a query: '{query}'")
+        return cached_context
+
     try:
-        # CORREÇÃO: O método padrão para executar um retriever é 'invoke'
-        nodes = retriever_instance.invoke(query)
-        
+        # 1. "Rede de Pesca Larga": busca vetorial + BM25 garantem que o
+        # chunk relevante seja capturado.
+        embedding = embed_query(query, index.manifest["embedding_model"])
+        candidates = retrieve_candidates(index, query, embedding)
+
+        # 2. "O Filtro Inteligente": rerank dos candidatos
+        nodes = rerank_candidates(index, index.reranker, query, embedding, candidates)
+
+        # 3. Empacotamento: só o que é relevante e cabe no orçamento de tokens,
+        # com chunks vizinhos da mesma página unidos (sem a sobreposição)
+        settings = get_settings()
+        nodes = pack_context(
+            nodes, settings.RAG_CONTEXT_MAX_TOKENS, settings.RAG_CONTEXT_MIN_SCORE_RATIO
+        )
+
         if not nodes:
-            logger.warning(f"Nenhum documento relevante encontrado para a query: '{query}'")
-            return "Nenhuma informação encontrada no edital para esta pergunta."
+            logger.warning(
+                f"Nenhum documento relevante encontrado para a query: '{query}'"
+            )
+            context_str = "Nenhuma informação encontrada no edital para esta pergunta."
+            retrieval_cache.set(cache_key, context_str)
+            return context_str
 
         # Formata o contexto com metadados da página
         context_list = []
@@ -127,17 +609,140 @@ def search_edital(query: str) -> str:
             # Converte para número de página real (1-indexed) se for um número
             if isinstance(page_number, int):
                 page_number += 1
-            
+
             text = node.page_content.replace("\n", " ")
             context_list.append(f"[Fonte: Página {page_number}] {text}")
 
         context_str = "\n\n---\n\n".join(context_list)
-        logger.info(f"Contexto encontrado para a query '{query}':\n{context_str[:500]}...")
+        logger.info(
+            f"Contexto encontrado para a query '{query}':\n{context_str[:500]}..."
+        )
+        retrieval_cache.set(cache_key, context_str)
         return context_str
-    
+
     except Exception as e:
-        logger.error(f"Erro durante a busca RAG para a query '{query}': {e}", exc_info=True)
+        logger.error(
+            f"Erro durante a busca RAG para a query '{query}': {e}", exc_info=True
+        )
         return "Ocorreu um erro ao tentar buscar a informação no edital."
 
 
-# print(search_edital("Quais são os requisitos para inscrição?"))  # Teste rápido
\ No newline at end of file
+# --- 7. Benchmark de Rerank ---
+BENCHMARK_QUERIES = [
+    "Qual a data da prova da primeira fase?",
+    "Qual o valor da taxa de inscrição?",
+    "Quem tem direito à isenção da taxa de inscrição?",
+    "Quantas vagas são reservadas para cotas étnico-raciais?",
+    "Como funciona o PAAIS e a bonificação?",
+    "Quais documentos levar no dia da prova?",
+    "Quando sai o resultado da segunda fase?",
+    "Quais cursos têm prova de habilidades específicas?",
+    "Qual o horário de abertura dos portões?",
+    "Como é calculada a nota final?",
+    "Posso usar calculadora na prova?",
+    "Quais são os critérios de desempate?",
+]
+
+
+def benchmark_rerankers(queries: List[str]) -> Dict[str, Any]:
+    """
+    Compara latência e recall@top_n do rerank local com o da Cohere (usado
+    como referência) sobre os mesmos candidatos. Bloqueante; faz chamadas à API.
+    """
+    version = read_current_version()
+    if version is None:
+        raise ValueError("Nenhuma versão do índice ativa; rode `build` antes.")
+
+    index = load_index_version(version)
+    cohere, local = build_reranker("cohere"), build_reranker("local")
+    latencies: Dict[str, List[float]] = {cohere.name: [], local.name: []}
+    recalls = []
+
+    for query in queries:
+        embedding = embed_query(query, index.manifest["embedding_model"])
+        candidates = retrieve_candidates(index, query, embedding)
+        rankings = {}
+        for reranker in (cohere, local):
+            started = time.perf_counter()
+            ranked = rerank_candidates(index, reranker, query, embedding, candidates)
+            latencies[reranker.name].append((time.perf_counter() - started) * 1000)
+            rankings[reranker.name] = {doc.metadata["chunk_id"] for doc in ranked}
+
+        reference = rankings[cohere.name]
+        if reference:
+            recalls.append(len(reference & rankings[local.name]) / len(reference))
+
+    return {
+        "queries": len(queries),
+        "candidates": get_settings().RAG_RERANK_CANDIDATES,
+        "latency_ms": {
+            name: {
+                "p50": statistics.median(values),
+                "max": max(values),
+            }
+            for name, values in latencies.items()
+            if values
+        },
+        "recall_vs_cohere": statistics.mean(recalls) if recalls else None,
+    }
+
+
+# --- 8. CLI: python -m app.services.rag <comando> ---
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.services.rag",
+        description="Gerencia as versões do índice RAG do edital.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Gera uma nova versão do índice.")
+    build.add_argument("--pdf", default=PDF_PATH, help="PDF de origem.")
+    build.add_argument(
+        "--no-activate",
+        action="store_true",
+        help="Apenas gera a versão, sem apontar CURRENT para ela.",
+    )
+
+    activate = commands.add_parser("activate", help="Ativa uma versão existente.")
+    activate.add_argument("version")
+
+    commands.add_parser("list", help="Lista as versões disponíveis.")
+
+    bench = commands.add_parser(
+        "bench-rerank", help="Compara o rerank local com o da Cohere."
+    )
+    bench.add_argument(
+        "--queries",
+        help="Arquivo texto com uma pergunta por linha (padrão: perguntas embutidas).",
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        with build_lock():
+            if read_current_version() is None:
+                import_legacy_embeddings()
+            version = build_index_version(args.pdf, activate=not args.no_activate)
+        cache_stats = read_manifest(version)["embedding_cache"]
+        print(
+            f"{version}  cache de embeddings: {cache_stats['hits']} acertos, "
+            f"{cache_stats['misses']} falhas"
+        )
+    elif args.command == "activate":
+        activate_version(args.version)
+    elif args.command == "list":
+        current = read_current_version()
+        for manifest in list_versions():
+            marker = "*" if manifest["version"] == current else " "
+            print(f"{marker} {manifest['version']}  chunks={manifest['chunks']}")
+    elif args.command == "bench-rerank":
+        queries = BENCHMARK_QUERIES
+        if args.queries:
+            with open(args.queries, encoding="utf-8") as f:
+                queries = [line.strip() for line in f if line.strip()]
+        print(json.dumps(benchmark_rerankers(queries), indent=2))
+
+
+if __name__ == "__main__":
+    main()
+
+# print(search_edital("Quais são os requisitos para inscrição?"))  # Teste rápido
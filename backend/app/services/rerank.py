@@ -0,0 +1,91 @@
+from typing import List, Optional, Protocol, Sequence
+
+import numpy as np
+from langchain_cohere import CohereRerank
+from langchain_core.documents import Document
+
+from app.services.lexical import tokenize
+
+
+class Reranker(Protocol):
+    """
+    Reordena os candidatos da busca e devolve os `top_n` mais relevantes,
+    com o score em `metadata["relevance_score"]`.
+    """
+
+    name: str
+
+    def rerank(
+        self,
+        query: str,
+        query_vector: np.ndarray,
+        candidates: Sequence[Document],
+        candidate_vectors: np.ndarray,
+    ) -> List[Document]: ...
+
+
+class CohereReranker:
+    """Rerank remoto (uma chamada à API da Cohere por busca)."""
+
+    name = "cohere"
+
+    def __init__(self, api_key: Optional[str], model: str, top_n: int) -> None:
+        self.compressor = CohereRerank(cohere_api_key=api_key, model=model, top_n=top_n)
+
+    def rerank(
+        self,
+        query: str,
+        query_vector: np.ndarray,
+        candidates: Sequence[Document],
+        candidate_vectors: np.ndarray,
+    ) -> List[Document]:
+        if not candidates:
+            return []
+        return list(self.compressor.compress_documents(candidates, query))
+
+
+class LocalReranker:
+    """
+    Rerank local em CPU, sem rede: combina a similaridade de cosseno entre os
+    embeddings (já calculados na busca) com a fração dos termos da pergunta
+    presentes no chunk, o que favorece matches exatos (códigos, datas, siglas).
+    Todos os candidatos são pontuados de uma vez, com operações vetorizadas.
+    """
+
+    name = "local"
+
+    def __init__(self, top_n: int, lexical_weight: float) -> None:
+        self.top_n = top_n
+        self.lexical_weight = lexical_weight
+
+    def rerank(
+        self,
+        query: str,
+        query_vector: np.ndarray,
+        candidates: Sequence[Document],
+        candidate_vectors: np.ndarray,
+    ) -> List[Document]:
+        if not candidates:
+            return []
+
+        query_norm = np.linalg.norm(query_vector) or 1.0
+        candidate_norms = np.linalg.norm(candidate_vectors, axis=1)
+        candidate_norms[candidate_norms == 0] = 1.0
+        semantic = candidate_vectors @ query_vector / (candidate_norms * query_norm)
+
+        query_terms = set(tokenize(query))
+        lexical = np.zeros(len(candidates), dtype=np.float32)
+        if query_terms:
+            for i, candidate in enumerate(candidates):
+                overlap = query_terms.intersection(tokenize(candidate.page_content))
+                lexical[i] = len(overlap) / len(query_terms)
+
+        scores = (1 - self.lexical_weight) * semantic + self.lexical_weight * lexical
+        ranked = []
+        for i in np.argsort(-scores)[: self.top_n]:
+            candidate = candidates[int(i)]
+            metadata = {**candidate.metadata, "relevance_score": float(scores[i])}
+            ranked.append(
+                Document(page_content=candidate.page_content, metadata=metadata)
+            )
+        return ranked
@@ -0,0 +1,125 @@
+import bisect
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.config.settings import get_settings
+from app.services.rag import embed_query, rag_state
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticProbe:
+    """Resultado da consulta ao cache para uma pergunta (reusado no `store`)."""
+
+    def __init__(self, vector: np.ndarray, version: str, answer: Optional[str]) -> None:
+        self.vector = vector
+        self.version = version
+        self.answer = answer
+
+
+class SemanticAnswerCache:
+    """
+    Cache de respostas para perguntas parecidas (paráfrases). Uma pergunta nova
+    reaproveita a resposta de outra cujo embedding tenha similaridade de cosseno
+    >= `threshold`, desde que respondida com a mesma versão do índice.
+    """
+
+    def __init__(self, threshold: float, max_entries: int, ttl_seconds: float) -> None:
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._version: Optional[str] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._answers: List[str] = []
+        self._expires_at: List[float] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def probe(self, question: str) -> Optional[SemanticProbe]:
+        """Embeda a pergunta e procura uma resposta próxima. Bloqueante."""
+        index = rag_state.index
+        if index is None:
+            return None
+
+        try:
+            embedding = embed_query(question, index.manifest["embedding_model"])
+        except Exception as e:
+            # O cache é só um atalho: sem embedding, segue o fluxo normal
+            logger.warning(f"Falha ao embedar pergunta para o cache semântico: {e}")
+            return None
+
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+
+        with self._lock:
+            if self._version != index.version:
+                # Nova versão do índice: respostas antigas podem estar desatualizadas
+                self._reset(index.version)
+
+            answer = None
+            if self._vectors is not None:
+                similarities = self._vectors @ vector
+                expired = np.asarray(self._expires_at) <= time.monotonic()
+                similarities[expired] = -1.0
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    answer = self._answers[best]
+
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return SemanticProbe(vector, index.version, answer)
+
+    def store(self, probe: SemanticProbe, answer: str) -> None:
+        with self._lock:
+            if probe.version != self._version:
+                return
+
+            now = time.monotonic()
+            vectors = probe.vector[np.newaxis, :]
+            if self._vectors is not None:
+                vectors = np.vstack([self._vectors, vectors])
+            self._answers.append(answer)
+            self._expires_at.append(now + self.ttl_seconds)
+
+            # Descarta as entradas expiradas (o TTL é fixo, então são as mais
+            # antigas) e, depois, as mais antigas além do limite
+            expired = bisect.bisect_right(self._expires_at, now)
+            drop = max(expired, len(self._answers) - self.max_entries)
+            if drop > 0:
+                vectors = vectors[drop:]
+                del self._answers[:drop]
+                del self._expires_at[:drop]
+            self._vectors = vectors
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self._version,
+                "entries": len(self._answers),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _reset(self, version: str) -> None:
+        self._version = version
+        self._vectors = None
+        self._answers = []
+        self._expires_at = []
+
+
+semantic_answer_cache = SemanticAnswerCache(
+    get_settings().SEMANTIC_CACHE_THRESHOLD,
+    get_settings().SEMANTIC_CACHE_MAX_ENTRIES,
+    get_settings().SEMANTIC_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,87 @@
+import asyncio
+import json
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.services.lexical import tokenize
+
+SPECULATIVE_TOOL = "search_edital"
+
+
+def query_similarity(a: str, b: str) -> float:
+    """Jaccard entre os termos (sem acento e sem stopwords) de duas queries."""
+    terms_a, terms_b = set(tokenize(a)), set(tokenize(b))
+    if not terms_a or not terms_b:
+        return 0.0
+    return len(terms_a & terms_b) / len(terms_a | terms_b)
+
+
+class SpeculationStats:
+    """Contadores do modo especulativo, expostos em `/metrics`."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.launched = 0
+        self.reused = 0
+        self.wasted = 0
+
+    def record(self, outcome: str) -> None:
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "launched": self.launched,
+                "reused": self.reused,
+                "wasted": self.wasted,
+                "reuse_rate": self.reused / self.launched if self.launched else 0.0,
+            }
+
+
+speculation_stats = SpeculationStats()
+
+
+class SpeculativeRetrieval:
+    """
+    Busca no edital disparada com a última mensagem do usuário, em paralelo à
+    primeira chamada ao LLM. Se o modelo pedir `search_edital` com uma query
+    parecida o bastante (`min_similarity`), o resultado já em andamento é
+    reaproveitado em vez de buscar de novo.
+    """
+
+    def __init__(
+        self,
+        query: str,
+        run: Callable[[str], Awaitable[Any]],
+        min_similarity: float,
+    ) -> None:
+        self.query = query
+        self.min_similarity = min_similarity
+        self._task: "asyncio.Task[Any]" = asyncio.ensure_future(run(query))
+        self._reused = False
+        speculation_stats.record("launched")
+
+    def matches(self, tool_name: Optional[str], raw_arguments: str) -> bool:
+        if tool_name != SPECULATIVE_TOOL or self._task.cancelled():
+            return False
+        try:
+            query = json.loads(raw_arguments).get("query")
+        except (ValueError, AttributeError):
+            return False
+        if not isinstance(query, str):
+            return False
+        return query_similarity(self.query, query) >= self.min_similarity
+
+    async def result(self) -> Any:
+        if not self._reused:
+            self._reused = True
+            speculation_stats.record("reused")
+        # shield: quem espera pode ser cancelado sem derrubar a busca compartilhada
+        return await asyncio.shield(self._task)
+
+    def discard(self) -> None:
+        """Cancela a busca se ninguém a usou (a thread em curso termina sozinha)."""
+        if not self._reused:
+            self._task.cancel()
+            speculation_stats.record("wasted")
@@ -0,0 +1,102 @@
+import logging
+from typing import Dict, List, Optional
+
+from openai import AsyncOpenAI
+
+from app.config.db import new_session
+from app.models import Message
+from app.repositories.ai import (
+    get_user_chat,
+    load_unsummarized_messages,
+    save_chat_summary,
+)
+from app.utils.stream import ui_message_text
+from app.utils.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """
+Você resume conversas entre um usuário e um assistente sobre o edital do
+Vestibular Unicamp 2026. Atualize o resumo existente com as novas mensagens.
+Preserve as perguntas do usuário, as respostas dadas (datas, valores, regras)
+e as páginas do edital citadas. Responda apenas com o resumo, em até 200 palavras.
+"""
+
+
+def summary_message(summary: str) -> Dict[str, str]:
+    """Mensagem de sistema que leva o resumo das conversas antigas ao prompt."""
+    return {
+        "role": "system",
+        "content": f"Resumo da conversa até aqui:\n{summary}",
+    }
+
+
+async def summarize_messages(
+    client: AsyncOpenAI,
+    model: str,
+    previous_summary: Optional[str],
+    messages: List[Message],
+) -> str:
+    transcript = "\n".join(
+        f"{msg.data.get('role', 'user')}: {ui_message_text(msg.data)}"
+        for msg in messages
+    )
+    completion = await client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {
+                "role": "user",
+                "content": f"Resumo existente:\n{previous_summary or '(vazio)'}\n\n"
+                f"Novas mensagens:\n{transcript}",
+            },
+        ],
+    )
+    return (completion.choices[0].message.content or "").strip()
+
+
+async def update_chat_summary(
+    client: AsyncOpenAI,
+    model: str,
+    chat_id: str,
+    user_id: int,
+    trigger_tokens: int,
+    keep_messages: int,
+) -> None:
+    """
+    Quando as mensagens ainda não resumidas passam de `trigger_tokens`, junta
+    todas menos as `keep_messages` mais recentes ao resumo salvo no `Chat`.
+    Roda depois do turno (background task), fora do caminho da resposta.
+    """
+    if trigger_tokens <= 0:
+        return
+
+    try:
+        # Sessões curtas: nenhuma conexão fica presa durante a chamada ao LLM
+        async with new_session() as session:
+            chat = await get_user_chat(session, chat_id, user_id)
+            messages = await load_unsummarized_messages(session, chat)
+
+        tokens = sum(estimate_tokens(ui_message_text(msg.data)) for msg in messages)
+        if tokens <= trigger_tokens or len(messages) <= keep_messages:
+            return
+
+        folded = messages[: len(messages) - keep_messages]
+        summary = await summarize_messages(client, model, chat.summary, folded)
+        if not summary:
+            return
+
+        source_tokens = chat.summary_source_tokens + sum(
+            estimate_tokens(ui_message_text(msg.data)) for msg in folded
+        )
+        async with new_session() as session:
+            saved = await save_chat_summary(
+                session, chat, summary, folded[-1].id, source_tokens
+            )
+        if saved:
+            logger.info(
+                f"Resumo do chat {chat_id} atualizado ({len(folded)} mensagens)"
+            )
+    except Exception as e:
+        # Sem resumo o próximo turno só manda mais histórico; não é fatal
+        logger.error(f"Falha ao resumir chat {chat_id}: {e}", exc_info=True)
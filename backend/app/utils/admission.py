@@ -0,0 +1,228 @@
+"""Admission control for streaming endpoints.
+
+Limits how many streams run at once, globally and per user, with a short
+bounded wait queue for the global limit and a per-user token bucket for the
+request rate. Rejections are fast and say when to retry.
+"""
+
+import asyncio
+import math
+import time
+import weakref
+from collections import deque
+from typing import Any, AsyncGenerator, Callable, Deque, Dict, Optional, Tuple
+
+# Idle buckets are dropped once there are this many users tracked
+MAX_TRACKED_BUCKETS = 10000
+
+
+class AdmissionRejected(Exception):
+    """The request was not admitted; retry after `retry_after` seconds."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class AdmissionSlot:
+    """A granted stream slot, released exactly once."""
+
+    def __init__(self, release: Callable[[], None]) -> None:
+        self._release: Optional[Callable[[], None]] = release
+        self.bound = False
+
+    def bind(self, on_close: Callable[[Callable[[], None]], None]) -> None:
+        """Hold the slot until a stream ends; `on_close` registers the release."""
+        self.bound = True
+        on_close(self.release)
+
+    def wrap(self, events: AsyncGenerator[bytes, None]) -> AsyncGenerator[bytes, None]:
+        """Hold the slot while `events` are streamed straight to a client.
+
+        The slot is released when the stream ends or is closed (e.g. on
+        disconnect), or when the response drops it without ever starting it.
+        """
+        self.bound = True
+        wrapped = self._release_after(events)
+        weakref.finalize(wrapped, self.release)
+        return wrapped
+
+    def release(self) -> None:
+        if self._release is not None:
+            release, self._release = self._release, None
+            release()
+
+    async def _release_after(
+        self, events: AsyncGenerator[bytes, None]
+    ) -> AsyncGenerator[bytes, None]:
+        try:
+            async for data in events:
+                yield data
+        finally:
+            self.release()
+            # Close the source now (and its upstream calls), not when collected
+            await events.aclose()
+
+
+class AdmissionController:
+    """Concurrency limits, wait queue and rate limit for one kind of stream.
+
+    A limit of 0 disables it. Over `max_streams`, requests wait in a FIFO
+    queue of up to `max_waiters` for `queue_timeout` seconds (503 when the
+    queue is full or the wait times out). Over `max_streams_per_user`, or out
+    of rate-limit tokens (`burst` refilled at `rate_per_minute`), a user gets
+    a 429 at once.
+    """
+
+    def __init__(
+        self,
+        max_streams: int,
+        max_streams_per_user: int,
+        max_waiters: int,
+        queue_timeout: float,
+        rate_per_minute: float,
+        burst: int,
+    ) -> None:
+        self.max_streams = max_streams
+        self.max_streams_per_user = max_streams_per_user
+        self.max_waiters = max_waiters
+        self.queue_timeout = queue_timeout
+        self.rate_per_second = rate_per_minute / 60
+        self.burst = max(burst, 1)
+        self.active = 0
+        self._user_active: Dict[int, int] = {}
+        self._buckets: Dict[int, Tuple[float, float]] = {}
+        self._waiters: "Deque[asyncio.Future[None]]" = deque()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected: Dict[str, int] = {
+            "rate_limited": 0,
+            "user_limit": 0,
+            "queue_full": 0,
+            "queue_timeout": 0,
+        }
+
+    async def admit(self, user_id: int) -> AdmissionSlot:
+        """Wait for a stream slot for `user_id`, or raise `AdmissionRejected`."""
+        self._take_token(user_id)
+        try:
+            user_active = self._user_active.get(user_id, 0)
+            if 0 < self.max_streams_per_user <= user_active:
+                self.rejected["user_limit"] += 1
+                raise AdmissionRejected(429, "Too many concurrent chat streams", 1.0)
+            # Count the user's slot while queued, so their other requests see it
+            self._user_active[user_id] = user_active + 1
+
+            try:
+                await self._acquire()
+            except BaseException:
+                self._release_user(user_id)
+                raise
+        except BaseException:
+            # Only admitted requests count toward the rate limit
+            self._refund_token(user_id)
+            raise
+
+        self.admitted += 1
+        return AdmissionSlot(lambda: self._release(user_id))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "max_streams": self.max_streams,
+            "waiting": len(self._waiters),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": dict(self.rejected),
+            "users_active": len(self._user_active),
+        }
+
+    def _take_token(self, user_id: int) -> None:
+        if self.rate_per_second <= 0:
+            return
+
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(user_id, (float(self.burst), now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate_per_second)
+        if tokens < 1:
+            self._buckets[user_id] = (tokens, now)
+            self.rejected["rate_limited"] += 1
+            raise AdmissionRejected(
+                429,
+                "Chat rate limit exceeded",
+                (1 - tokens) / self.rate_per_second,
+            )
+
+        self._buckets[user_id] = (tokens - 1, now)
+        if len(self._buckets) > MAX_TRACKED_BUCKETS:
+            self._prune_buckets(now)
+
+    def _refund_token(self, user_id: int) -> None:
+        if self.rate_per_second <= 0 or user_id not in self._buckets:
+            return
+        tokens, updated_at = self._buckets[user_id]
+        self._buckets[user_id] = (min(self.burst, tokens + 1), updated_at)
+
+    def _prune_buckets(self, now: float) -> None:
+        refill_seconds = self.burst / self.rate_per_second
+        for user_id, (_, updated_at) in list(self._buckets.items()):
+            if now - updated_at >= refill_seconds:
+                del self._buckets[user_id]
+
+    async def _acquire(self) -> None:
+        if self.max_streams <= 0 or (
+            self.active < self.max_streams and not self._waiters
+        ):
+            self.active += 1
+            return
+
+        if len(self._waiters) >= self.max_waiters or self.queue_timeout <= 0:
+            self.rejected["queue_full"] += 1
+            raise AdmissionRejected(503, "Chat is at capacity", self.queue_timeout or 1)
+
+        self.queued += 1
+        waiter: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except BaseException as e:
+            if waiter.done():
+                # The slot was handed over just as the wait ended
+                if isinstance(e, asyncio.TimeoutError):
+                    return
+                self._release_slot()
+                raise
+            waiter.cancel()
+            self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected["queue_timeout"] += 1
+                raise AdmissionRejected(
+                    503, "Chat is at capacity", self.queue_timeout
+                ) from None
+            raise
+
+    def _release(self, user_id: int) -> None:
+        self._release_user(user_id)
+        self._release_slot()
+
+    def _release_user(self, user_id: int) -> None:
+        remaining = self._user_active.get(user_id, 0) - 1
+        if remaining > 0:
+            self._user_active[user_id] = remaining
+        else:
+            self._user_active.pop(user_id, None)
+
+    def _release_slot(self) -> None:
+        # Hand the slot straight to the next waiter, if any
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
@@ -1,18 +1,65 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
 import json
 import logging
+import re
 import traceback
 import uuid
-from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 from fastapi import BackgroundTasks
 from fastapi.responses import StreamingResponse
-from openai import OpenAI
+from openai import AsyncOpenAI
 from openai.types.chat.chat_completion_message_param import ChatCompletionMessageParam
-from sqlmodel import Session
 
-from app.config.db import engine
+from app.config.db import new_session
+from app.config.settings import get_settings
 from app.repositories.ai import save_chat
 from app.schemas.ai import ClientMessage
+from app.services.semantic_cache import SemanticAnswerCache
+from app.services.speculative import SPECULATIVE_TOOL, SpeculativeRetrieval
+from app.services.summary import update_chat_summary
+from app.utils.stream import UIMessageAccumulator, UIMessageChunk, ui_message_text
+from app.utils.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Tools run on their own bounded pool rather than the default executor: a call
+# that times out keeps its thread until the tool returns, and hung calls must
+# not starve everything else that uses `asyncio.to_thread`
+_tool_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_tool_executor() -> ThreadPoolExecutor:
+    """Return the tool thread pool, starting a new one after a shutdown."""
+    global _tool_executor
+    if _tool_executor is None:
+        _tool_executor = ThreadPoolExecutor(
+            max_workers=get_settings().TOOL_EXECUTOR_MAX_WORKERS,
+            thread_name_prefix="tool",
+        )
+    return _tool_executor
+
+
+def shutdown_tool_executor() -> None:
+    """Stop the tool thread pool without waiting on calls still hung in it."""
+    global _tool_executor
+    executor, _tool_executor = _tool_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 # # Adiciona uma configuração básica de logging para ver a saída no console
@@ -169,336 +216,503 @@ def convert_to_openai_messages(
     return openai_messages
 
 
-def stream_text(
-    client: OpenAI,
+def window_messages(
+    messages: List[Dict[str, Any]],
+    max_tokens: int,
+) -> List[Dict[str, Any]]:
+    """Keep the most recent UIMessages that fit in `max_tokens` (0 keeps all)."""
+    if max_tokens <= 0:
+        return messages
+
+    total = 0
+    for start in range(len(messages) - 1, -1, -1):
+        total += estimate_tokens(ui_message_text(messages[start]))
+        if total > max_tokens:
+            return messages[start + 1 :]
+    return messages
+
+
+def estimate_prompt_tokens(messages: Sequence[ChatCompletionMessageParam]) -> int:
+    """Rough token count of a prompt, for reporting context savings."""
+    total = 0
+    for message in messages:
+        content = message.get("content")
+        if content:
+            total += estimate_tokens(
+                content if isinstance(content, str) else json.dumps(content)
+            )
+        for tool_call in message.get("tool_calls") or []:  # type: ignore[attr-defined]
+            total += estimate_tokens(tool_call["function"]["arguments"])
+    return total
+
+
+def latest_user_text(
+    messages: Sequence[ChatCompletionMessageParam],
+) -> Optional[str]:
+    """Return the text of the last message when it comes from the user."""
+    if not messages or messages[-1]["role"] != "user":
+        return None
+
+    content = messages[-1].get("content")
+    if isinstance(content, list):
+        content = " ".join(
+            part.get("text", "") for part in content if part.get("type") == "text"
+        )
+    return content if isinstance(content, str) and content.strip() else None
+
+
+def tool_input_available(state: Dict[str, Any]) -> UIMessageChunk:
+    """The `tool-input-available` chunk for a streamed call's full arguments."""
+    try:
+        tool_input = json.loads(state["arguments"]) if state["arguments"] else {}
+    except json.JSONDecodeError:
+        tool_input = state["arguments"]
+    return {
+        "type": "tool-input-available",
+        "toolCallId": state["id"],
+        "toolName": state["name"],
+        "input": tool_input,
+    }
+
+
+async def execute_tool_call(
+    available_tools: Mapping[str, Callable[..., Any]],
+    tool_name: Optional[str],
+    raw_arguments: str,
+    timeout: float,
+    semaphore: Optional[asyncio.Semaphore] = None,
+) -> Any:
+    """Run one tool call on the tool executor and return its result (or error).
+
+    Python threads can't be interrupted, so `timeout` only stops waiting: the
+    thread of a timed-out call stays busy until the tool returns. Hung calls
+    therefore hold tool executor workers rather than pile up new threads,
+    and tools should still bound their own I/O (e.g. client timeouts).
+
+    Without a `semaphore`, the call doesn't wait for a concurrency slot.
+    """
+    tool_function = available_tools.get(tool_name) if tool_name else None
+    if tool_function is None:
+        return {"error": f"Tool '{tool_name}' not found."}
+
+    try:
+        parsed_arguments = json.loads(raw_arguments) if raw_arguments else {}
+        call = functools.partial(
+            contextvars.copy_context().run, tool_function, **parsed_arguments
+        )
+        async with semaphore or contextlib.nullcontext():
+            return await asyncio.wait_for(
+                asyncio.get_running_loop().run_in_executor(get_tool_executor(), call),
+                timeout,
+            )
+    except asyncio.TimeoutError:
+        return {"error": f"Tool '{tool_name}' timed out after {timeout}s."}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+async def stream_text(
+    client: AsyncOpenAI,
     messages: Sequence[ChatCompletionMessageParam],
     tool_definitions: Sequence[Dict[str, Any]],
     available_tools: Mapping[str, Callable[..., Any]],
     model: str,
     protocol: str = "data",
-):
-    """Yield Server-Sent Events for a streaming chat completion."""
+    semantic_cache: Optional[SemanticAnswerCache] = None,
+    message_metadata: Optional[Dict[str, Any]] = None,
+    first_turn: bool = False,
+) -> AsyncIterator[UIMessageChunk]:
+    """Yield UI message stream chunks for a streaming chat completion.
+
+    Chunks are plain payload dicts; they are serialised once, at the edge,
+    by `sse_stream`, so consumers such as `stream_text_with_persistence` read
+    them directly instead of parsing the encoded events back.
+
+    Runs entirely on the event loop: the completions are awaited through the
+    shared `AsyncOpenAI` client and blocking tools are offloaded to a thread,
+    so a stream never pins a Starlette threadpool worker.
+
+    The model may call tools for up to `TOOL_MAX_ROUNDS` rounds; each round is
+    a step in the UI stream, and every tool result is sent as soon as it is
+    ready. The last round is requested with `tool_choice="none"` so the turn
+    always ends with text.
+
+    When a `semantic_cache` is given and the request is the `first_turn` of
+    a conversation (no earlier messages and no summary), a question close
+    enough to one already answered is replayed from the cache without calling
+    the LLM. Later turns never use the cache: their answer depends on context
+    the question alone doesn't carry.
+
+    With `SPECULATIVE_RETRIEVAL_ENABLED`, `search_edital` is started on the
+    latest user message alongside the first completion, and its result is
+    reused when the model asks for a close enough query.
+
+    `message_metadata` is merged into the finish event's metadata.
+    """
+    speculation: Optional[SpeculativeRetrieval] = None
     try:
-        # logger.info("--- Chamada para API OpenAI (1ª) ---")
+        # logger.info("--- Chamada para API OpenAI ---")
         # logger.info(f"MODEL: {model}")
         # logger.info(f"MESSAGES: {json.dumps(list(messages), indent=2, ensure_ascii=False)}")
-        # logger.info("------------------------------------")
-
-        def format_sse(payload: dict) -> str:
-            return f"data: {json.dumps(payload, separators=(',', ':'))}\n\n"
+        # logger.info("-------------------------------")
 
+        settings = get_settings()
         message_id = f"msg-{uuid.uuid4().hex}"
-        text_stream_id = "text-1"
-        text_started = False
-        text_finished = False
         finish_reason = None
-        usage_data = None
-        tool_calls_state: Dict[int, Dict[str, Any]] = {}
-
-        yield format_sse({"type": "start", "messageId": message_id})
-
-        stream = client.chat.completions.create(
-            messages=messages,
-            model=model,
-            stream=True,
-            tools=tool_definitions,
-        )
+        usage_totals: Optional[Dict[str, int]] = None
+        # Text of the latest round: the answer, once no more tools are called
+        answer_parts: List[str] = []
+
+        yield {"type": "start", "messageId": message_id}
+
+        probe = None
+        if semantic_cache is not None and first_turn:
+            question = latest_user_text(messages)
+            if question is not None:
+                probe = await asyncio.to_thread(semantic_cache.probe, question)
+
+        if probe is not None and probe.answer is not None:
+            yield {"type": "text-start", "id": "text-1"}
+            for delta in re.findall(r"\S+\s*", probe.answer):
+                yield {"type": "text-delta", "id": "text-1", "delta": delta}
+            yield {"type": "text-end", "id": "text-1"}
+            yield {
+                "type": "finish",
+                "messageMetadata": {
+                    **(message_metadata or {}),
+                    "finishReason": "stop",
+                    "cached": True,
+                },
+            }
+            return
+
+        messages = list(messages)  # Convert sequence to list to append
+        semaphore = asyncio.Semaphore(settings.TOOL_MAX_CONCURRENCY)
+        max_rounds = max(settings.TOOL_MAX_ROUNDS, 0)
+
+        if settings.SPECULATIVE_RETRIEVAL_ENABLED and max_rounds > 0:
+            question = latest_user_text(messages)
+            if question is not None and SPECULATIVE_TOOL in available_tools:
+                # Outside the semaphore: a speculation must not hold up the
+                # tool calls the model actually makes
+                speculation = SpeculativeRetrieval(
+                    question,
+                    lambda query: execute_tool_call(
+                        available_tools,
+                        SPECULATIVE_TOOL,
+                        json.dumps({"query": query}),
+                        settings.TOOL_TIMEOUT_SECONDS,
+                    ),
+                    settings.SPECULATIVE_RETRIEVAL_MIN_SIMILARITY,
+                )
 
-        for chunk in stream:
-            for choice in chunk.choices:
-                if choice.finish_reason is not None:
-                    finish_reason = choice.finish_reason
+        for round_index in range(max_rounds + 1):
+            final_round = round_index == max_rounds
+            text_stream_id = f"text-{round_index + 1}"
+            text_started = False
+            round_text: List[str] = []
+            tool_calls_state: Dict[int, Dict[str, Any]] = {}
+            finish_reason = None
 
-                delta = choice.delta
-                if delta is None:
-                    continue
+            yield {"type": "start-step"}
 
-                if delta.content is not None:
-                    if not text_started:
-                        yield format_sse({"type": "text-start", "id": text_stream_id})
-                        text_started = True
-                    yield format_sse(
-                        {
-                            "type": "text-delta",
-                            "id": text_stream_id,
-                            "delta": delta.content,
-                        }
-                    )
+            stream = await client.chat.completions.create(
+                messages=messages,
+                model=model,
+                stream=True,
+                tools=tool_definitions,
+                tool_choice="none" if final_round else "auto",
+            )
 
-                if delta.tool_calls:
-                    for tool_call_delta in delta.tool_calls:
-                        index = tool_call_delta.index
-                        state = tool_calls_state.setdefault(
-                            index,
-                            {
-                                "id": None,
-                                "name": None,
-                                "arguments": "",
-                                "started": False,
-                            },
-                        )
+            # Closing the stream also ends the upstream request on cancellation
+            async with stream:
+                async for chunk in stream:
+                    for choice in chunk.choices:
+                        if choice.finish_reason is not None:
+                            finish_reason = choice.finish_reason
+
+                        delta = choice.delta
+                        if delta is None:
+                            continue
+
+                        if delta.content is not None:
+                            if not text_started:
+                                yield {"type": "text-start", "id": text_stream_id}
+                                text_started = True
+                            round_text.append(delta.content)
+                            yield {
+                                "type": "text-delta",
+                                "id": text_stream_id,
+                                "delta": delta.content,
+                            }
 
-                        if tool_call_delta.id is not None:
-                            state["id"] = tool_call_delta.id
-                            if (
-                                state["id"] is not None
-                                and state["name"] is not None
-                                and not state["started"]
-                            ):
-                                yield format_sse(
+                        if delta.tool_calls:
+                            for tool_call_delta in delta.tool_calls:
+                                index = tool_call_delta.index
+                                if index not in tool_calls_state:
+                                    # Calls are streamed one after another, so
+                                    # the earlier ones' arguments are complete
+                                    for state in tool_calls_state.values():
+                                        if not state["announced"]:
+                                            state["announced"] = True
+                                            yield tool_input_available(state)
+                                state = tool_calls_state.setdefault(
+                                    index,
                                     {
-                                        "type": "tool-input-start",
-                                        "toolCallId": state["id"],
-                                        "toolName": state["name"],
-                                    }
+                                        "id": None,
+                                        "name": None,
+                                        "arguments": "",
+                                        "started": False,
+                                        "announced": False,
+                                    },
                                 )
-                                state["started"] = True
 
-                        function_call = getattr(tool_call_delta, "function", None)
-                        if function_call is not None:
-                            if function_call.name is not None:
-                                state["name"] = function_call.name
+                                if tool_call_delta.id is not None:
+                                    state["id"] = tool_call_delta.id
+
+                                function_call = getattr(
+                                    tool_call_delta, "function", None
+                                )
                                 if (
-                                    state["id"] is not None
-                                    and state["name"] is not None
-                                    and not state["started"]
+                                    function_call is not None
+                                    and function_call.name is not None
                                 ):
-                                    yield format_sse(
-                                        {
-                                            "type": "tool-input-start",
-                                            "toolCallId": state["id"],
-                                            "toolName": state["name"],
-                                        }
-                                    )
-                                    state["started"] = True
+                                    state["name"] = function_call.name
 
-                            if function_call.arguments:
                                 if (
                                     state["id"] is not None
                                     and state["name"] is not None
                                     and not state["started"]
                                 ):
-                                    yield format_sse(
-                                        {
-                                            "type": "tool-input-start",
-                                            "toolCallId": state["id"],
-                                            "toolName": state["name"],
-                                        }
-                                    )
+                                    yield {
+                                        "type": "tool-input-start",
+                                        "toolCallId": state["id"],
+                                        "toolName": state["name"],
+                                    }
                                     state["started"] = True
 
-                                state["arguments"] += function_call.arguments
-                                if state["id"] is not None:
-                                    yield format_sse(
-                                        {
+                                if (
+                                    function_call is not None
+                                    and function_call.arguments
+                                ):
+                                    state["arguments"] += function_call.arguments
+                                    if state["id"] is not None:
+                                        yield {
                                             "type": "tool-input-delta",
                                             "toolCallId": state["id"],
                                             "inputTextDelta": function_call.arguments,
                                         }
-                                    )
 
-            if not chunk.choices and chunk.usage is not None:
-                usage_data = chunk.usage
+                    if not chunk.choices and chunk.usage is not None:
+                        usage_totals = usage_totals or {}
+                        for key in (
+                            "prompt_tokens",
+                            "completion_tokens",
+                            "total_tokens",
+                        ):
+                            value = getattr(chunk.usage, key, None)
+                            if value is not None:
+                                usage_totals[key] = usage_totals.get(key, 0) + value
 
-        if finish_reason == "stop" and text_started and not text_finished:
-            yield format_sse({"type": "text-end", "id": text_stream_id})
-            text_finished = True
+            if text_started:
+                yield {"type": "text-end", "id": text_stream_id}
+            answer_parts = round_text
 
-        if finish_reason == "tool_calls":
-            # Append the assistant's tool-calling message
-            assistant_message = {
-                "role": "assistant",
-                "content": None,
-                "tool_calls": [
-                    {
-                        "id": state["id"],
-                        "type": "function",
-                        "function": {"name": state["name"], "arguments": state["arguments"]},
-                    }
-                    for state in tool_calls_state.values()
-                ],
-            }
-            messages = list(messages)  # Convert sequence to list to append
-            messages.append(assistant_message)
-
-            # Execute tools and gather results
-            for index in sorted(tool_calls_state.keys()):
-                state = tool_calls_state[index]
-                tool_call_id = state.get("id")
-                tool_name = state.get("name")
-                raw_arguments = state["arguments"]
-
-                try:
-                    parsed_arguments = json.loads(raw_arguments) if raw_arguments else {}
-                    tool_function = available_tools.get(tool_name)
-                    
-                    if tool_function:
-                        tool_result = tool_function(**parsed_arguments)
-                        messages.append(
-                            {
-                                "role": "tool",
-                                "tool_call_id": tool_call_id,
-                                "content": json.dumps(tool_result),
-                            }
-                        )
-                    else:
-                        messages.append(
-                            {
-                                "role": "tool",
-                                "tool_call_id": tool_call_id,
-                                "content": json.dumps({"error": f"Tool '{tool_name}' not found."}),
-                            }
-                        )
+            if final_round or finish_reason != "tool_calls" or not tool_calls_state:
+                yield {"type": "finish-step"}
+                break
 
-                except Exception as e:
-                    messages.append(
+            # Append the assistant's tool-calling message
+            ordered_states = [
+                tool_calls_state[index] for index in sorted(tool_calls_state)
+            ]
+            messages.append(
+                {
+                    "role": "assistant",
+                    "content": "".join(round_text) or None,
+                    "tool_calls": [
                         {
-                            "role": "tool",
-                            "tool_call_id": tool_call_id,
-                            "content": json.dumps({"error": str(e)}),
+                            "id": state["id"],
+                            "type": "function",
+                            "function": {
+                                "name": state["name"],
+                                "arguments": state["arguments"],
+                            },
                         }
-                    )
-
-            # # Second call to OpenAI with tool results
-            # logger.info("--- Chamada para API OpenAI (2ª, com resultado da tool) ---")
-            # logger.info(f"MODEL: {model}")
-            # logger.info(f"MESSAGES: {json.dumps(list(messages), indent=2, ensure_ascii=False)}")
-            # logger.info("----------------------------------------------------------")
-            second_stream = client.chat.completions.create(
-                messages=messages,
-                model=model,
-                stream=True,
-                tools=tool_definitions,
+                        for state in ordered_states
+                    ],
+                }
             )
 
-            for chunk in second_stream:
-                for choice in chunk.choices:
-                    if choice.finish_reason is not None:
-                        finish_reason = choice.finish_reason
-
-                    delta = choice.delta
-                    if delta is None:
-                        continue
-
-                    if delta.content is not None:
-                        if not text_started:
-                            yield format_sse({"type": "text-start", "id": text_stream_id})
-                            text_started = True
-                        yield format_sse(
-                            {
-                                "type": "text-delta",
-                                "id": text_stream_id,
-                                "delta": delta.content,
-                            }
-                        )
-                
-                if not chunk.choices and chunk.usage is not None:
-                    usage_data = chunk.usage
+            for state in ordered_states:
+                if not state["announced"]:
+                    state["announced"] = True
+                    yield tool_input_available(state)
+
+            # Execute tools concurrently and stream each result as it finishes
+            async def run_tool(position: int, state: Dict[str, Any]) -> Tuple[int, Any]:
+                if speculation is not None and speculation.matches(
+                    state.get("name"), state["arguments"]
+                ):
+                    return position, await speculation.result()
+
+                result = await execute_tool_call(
+                    available_tools,
+                    state.get("name"),
+                    state["arguments"],
+                    settings.TOOL_TIMEOUT_SECONDS,
+                    semaphore,
+                )
+                return position, result
 
+            tool_results: List[Any] = [None] * len(ordered_states)
+            tool_tasks = [
+                asyncio.ensure_future(run_tool(position, state))
+                for position, state in enumerate(ordered_states)
+            ]
+            try:
+                for next_result in asyncio.as_completed(tool_tasks):
+                    position, tool_result = await next_result
+                    tool_results[position] = tool_result
+                    yield {
+                        "type": "tool-output-available",
+                        "toolCallId": ordered_states[position]["id"],
+                        "output": tool_result,
+                    }
+            finally:
+                # Abort the calls still pending when the stream is cancelled
+                for task in tool_tasks:
+                    task.cancel()
+
+            # Tool messages go back to the model in call order
+            for state, tool_result in zip(ordered_states, tool_results):
+                messages.append(
+                    {
+                        "role": "tool",
+                        "tool_call_id": state.get("id"),
+                        "content": json.dumps(tool_result),
+                    }
+                )
 
-        if text_started and not text_finished:
-            yield format_sse({"type": "text-end", "id": text_stream_id})
-            text_finished = True
+            yield {"type": "finish-step"}
 
-        finish_metadata: Dict[str, Any] = {}
+        finish_metadata: Dict[str, Any] = dict(message_metadata or {})
         if finish_reason is not None:
             finish_metadata["finishReason"] = finish_reason.replace("_", "-")
 
-        if usage_data is not None:
+        if usage_totals is not None:
             usage_payload = {
-                "promptTokens": usage_data.prompt_tokens,
-                "completionTokens": usage_data.completion_tokens,
+                "promptTokens": usage_totals.get("prompt_tokens", 0),
+                "completionTokens": usage_totals.get("completion_tokens", 0),
             }
-            total_tokens = getattr(usage_data, "total_tokens", None)
-            if total_tokens is not None:
-                usage_payload["totalTokens"] = total_tokens
+            if "total_tokens" in usage_totals:
+                usage_payload["totalTokens"] = usage_totals["total_tokens"]
             finish_metadata["usage"] = usage_payload
 
+        if probe is not None and finish_reason == "stop" and answer_parts:
+            semantic_cache.store(probe, "".join(answer_parts))  # type: ignore[union-attr]
+
         if finish_metadata:
-            yield format_sse({"type": "finish", "messageMetadata": finish_metadata})
+            yield {"type": "finish", "messageMetadata": finish_metadata}
         else:
-            yield format_sse({"type": "finish"})
-
-        yield "data: [DONE]\n\n"
+            yield {"type": "finish"}
     except Exception as e:
         traceback.print_exc()
-        # Send error message in SSE format instead of raising
+        # Send the error as a stream chunk instead of raising
         error_message = str(e)
 
-        yield format_sse(
-            {
-                "type": "error",
-                "errorText": error_message,
-            }
-        )
-        yield "data: [DONE]\n\n"
+        yield {
+            "type": "error",
+            "errorText": error_message,
+        }
+    finally:
+        if speculation is not None:
+            speculation.discard()
 
 
-def stream_text_with_persistence(
-    client: OpenAI,
+async def stream_text_with_persistence(
+    client: AsyncOpenAI,
     messages: Sequence[ChatCompletionMessageParam],
     tool_definitions: Sequence[Dict[str, Any]],
     available_tools: Mapping[str, Callable[..., Any]],
     model: str,
     protocol: str,
-    ui_messages: List[dict[str, Any]],
+    new_messages: List[dict[str, Any]],
     chat_id: str,
     user_id: int,
     background_tasks: BackgroundTasks,
-) -> Any:
+    semantic_cache: Optional[SemanticAnswerCache] = None,
+    message_metadata: Optional[Dict[str, Any]] = None,
+    first_turn: bool = False,
+) -> AsyncIterator[UIMessageChunk]:
     """
     Stream text response with persistence support.
-    Tracks message completion and saves to database when stream completes.
+    Builds the assistant UIMessage (text, tool calls and tool outputs) from
+    the chunks as they pass through and, when the stream completes, appends
+    `new_messages` plus that reply to the chat, then folds older turns into
+    the chat's rolling summary once they exceed `CHAT_SUMMARY_TRIGGER_TOKENS`.
+    A cancelled stream still saves what was generated, with a `cancelled`
+    finish reason.
     """
-    collected_delta: List[str] = []
-    message_id: Optional[str] = None
+    accumulator = UIMessageAccumulator()
 
-    for event in stream_text(
+    try:
+        async for chunk in stream_text(
+            client,
+            messages,
+            tool_definitions,
+            available_tools,
+            model,
+            protocol,
+            semantic_cache,
+            message_metadata,
+            first_turn,
+        ):
+            accumulator.add(chunk)
+            yield chunk
+    except asyncio.CancelledError:
+        # The client is gone: keep the partial reply, marked as cancelled
+        accumulator.metadata["finishReason"] = "cancelled"
+        raise
+    finally:
+        _schedule_persistence(
+            client, model, new_messages, chat_id, user_id, accumulator, background_tasks
+        )
+
+
+def _schedule_persistence(
+    client: AsyncOpenAI,
+    model: str,
+    new_messages: List[dict[str, Any]],
+    chat_id: str,
+    user_id: int,
+    accumulator: UIMessageAccumulator,
+    background_tasks: BackgroundTasks,
+) -> None:
+    """Queue saving the turn and updating the chat summary."""
+    settings = get_settings()
+    assistant_msg = accumulator.message(f"msg-{uuid.uuid4().hex[:16]}")
+    final_messages = new_messages + [assistant_msg]
+
+    # Create a wrapper that creates a new session for the background task
+    async def save_chat_task():
+        try:
+            async with new_session() as bg_session:
+                await save_chat(bg_session, chat_id, user_id, final_messages)
+        except Exception as e:
+            # Log error but don't fail the request
+            logger.error(f"Failed to save chat {chat_id}: {e}", exc_info=True)
+
+    background_tasks.add_task(save_chat_task)
+    background_tasks.add_task(
+        update_chat_summary,
         client,
-        messages,
-        tool_definitions,
-        available_tools,
         model,
-        protocol,
-    ):
-        # Parse SSE event to track message completion
-        if isinstance(event, str) and event.startswith("data: "):
-            try:
-                data_str = event[6:].strip()
-                if data_str == "[DONE]":
-                    # Save messages when stream completes
-                    assistant_msg = {
-                        "id": message_id or f"msg-{uuid.uuid4().hex[:16]}",
-                        "role": "assistant",
-                        "parts": [{"type": "text", "text": "".join(collected_delta)}],
-                    }
-                    final_messages = ui_messages + [assistant_msg]
-
-                    # Create a wrapper that creates a new session for the background task
-                    def save_chat_task():
-                        try:
-                            with Session(engine) as bg_session:
-                                save_chat(bg_session, chat_id, user_id, final_messages)
-                        except Exception as e:
-                            # Log error but don't fail the request
-                            logger = logging.getLogger(__name__)
-                            logger.error(
-                                f"Failed to save chat {chat_id}: {e}",
-                                exc_info=True,
-                            )
-
-                    background_tasks.add_task(save_chat_task)
-                else:
-                    data = json.loads(data_str)
-                    if data.get("type") == "start":
-                        message_id = data.get("messageId")
-                    elif data.get("type") == "text-delta":
-                        delta = data.get("delta", "")
-                        collected_delta.append(delta)
-            except Exception:
-                pass
-
-        yield event
+        chat_id,
+        user_id,
+        settings.CHAT_SUMMARY_TRIGGER_TOKENS,
+        settings.CHAT_SUMMARY_KEEP_MESSAGES,
+    )
 
 
 def patch_response_with_headers(
@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
 
 from fastapi import HTTPException, Response
 from jose import JWTError, jwt
@@ -11,11 +12,13 @@ def create_jwt(
     sub: str,
     alg: str,
     exp_minutes: int,
+    claims: Optional[Dict[str, Any]] = None,
 ):
     now = datetime.now(timezone.utc)
     exp = now + timedelta(minutes=exp_minutes)
 
     payload = {
+        **(claims or {}),
         "sub": sub,
         "iat": now,
         "exp": exp.timestamp(),
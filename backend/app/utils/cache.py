@@ -0,0 +1,192 @@
+"""In-process LRU/TTL cache with an optional shared (Redis) layer."""
+
+import json
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Generic, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+V = TypeVar("V")
+
+
+class RedisCacheStore:
+    """Shared cache layer so several workers reuse each other's entries.
+
+    Requires the optional `redis` package; values are stored as JSON. The
+    client is created on first use with short socket timeouts. Without the
+    package, the store stays disabled; after a connection error it is skipped
+    for `retry_interval` seconds. Either way the cache falls back to its
+    local entries instead of failing or stalling requests.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        prefix: str,
+        timeout_seconds: float = 0.1,
+        retry_interval: float = 30.0,
+    ) -> None:
+        self.url = url
+        self.prefix = prefix
+        self.timeout_seconds = timeout_seconds
+        self.retry_interval = retry_interval
+        self._client: Any = None
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._retry_at
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._call("get", self.prefix + key)
+        return value.decode() if value is not None else None
+
+    def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        self._call("set", self.prefix + key, value, px=int(ttl_seconds * 1000))
+
+    def delete(self, key: str) -> None:
+        self._call("delete", self.prefix + key)
+
+    def _call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        client = self._get_client()
+        if client is None:
+            return None
+        try:
+            return getattr(client, method)(*args, **kwargs)
+        except Exception as e:
+            # Skip the shared layer for a while rather than wait on every call
+            self._retry_at = time.monotonic() + self.retry_interval
+            logger.warning(
+                f"Shared cache unavailable, using the local cache for "
+                f"{self.retry_interval:g}s: {e}"
+            )
+            return None
+
+    def _get_client(self) -> Any:
+        if not self.available:
+            return None
+        with self._lock:
+            if self._client is None:
+                try:
+                    import redis  # optional dependency, only needed when configured
+
+                    self._client = redis.Redis.from_url(
+                        self.url,
+                        socket_timeout=self.timeout_seconds,
+                        socket_connect_timeout=self.timeout_seconds,
+                    )
+                except Exception as e:
+                    self._retry_at = math.inf
+                    logger.warning(
+                        f"Shared cache disabled, using the local cache only: {e}"
+                    )
+                    return None
+            return self._client
+
+
+class TTLCache(Generic[V]):
+    """Thread-safe LRU cache whose entries also expire after `ttl_seconds`.
+
+    When a `shared` store is given, local misses fall through to it and
+    writes go to both. Shared-store failures are logged and treated as misses.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        shared: Optional[RedisCacheStore] = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self._entries: "OrderedDict[str, Tuple[float, V]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[V]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        value = self._get_shared(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.shared_hits += 1
+            self._put(key, value, now)
+        return value
+
+    def set(self, key: str, value: V) -> None:
+        with self._lock:
+            self._put(key, value, time.monotonic())
+
+        if self.shared is not None:
+            try:
+                self.shared.set(key, json.dumps(value), self.ttl_seconds)
+            except Exception as e:
+                logger.warning(f"Shared cache write failed: {e}")
+
+    def delete(self, key: str) -> None:
+        """Drop one entry, locally and from the shared store."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+        if self.shared is not None:
+            try:
+                self.shared.delete(key)
+            except Exception as e:
+                logger.warning(f"Shared cache delete failed: {e}")
+
+    def clear(self) -> None:
+        """Drop local entries (shared entries are expected to be namespaced)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.shared_hits) / lookups
+                if lookups
+                else 0.0,
+            }
+
+    def _put(self, key: str, value: V, now: float) -> None:
+        self._entries[key] = (now + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _get_shared(self, key: str) -> Optional[V]:
+        if self.shared is None:
+            return None
+        try:
+            raw = self.shared.get(key)
+        except Exception as e:
+            logger.warning(f"Shared cache read failed: {e}")
+            return None
+        return json.loads(raw) if raw is not None else None
@@ -0,0 +1,21 @@
+"""In-process metrics exposed by the `/metrics` endpoint."""
+
+from typing import Any, Callable, Dict
+
+MetricsCollector = Callable[[], Dict[str, Any]]
+
+_collectors: Dict[str, MetricsCollector] = {}
+
+
+def register_collector(name: str, collector: MetricsCollector) -> None:
+    """Register (or replace) a callable returning a snapshot of metrics."""
+    _collectors[name] = collector
+
+
+def unregister_collector(name: str) -> None:
+    _collectors.pop(name, None)
+
+
+def collect_metrics() -> Dict[str, Any]:
+    """Return a snapshot of every registered collector, keyed by name."""
+    return {name: collector() for name, collector in _collectors.items()}
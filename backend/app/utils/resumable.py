@@ -0,0 +1,284 @@
+"""Resumable SSE streams: generation decoupled from the HTTP connection.
+
+Each response stream runs in its own task and writes its encoded events to a
+bounded in-process buffer. The response that started it, and any client that
+reconnects with `Last-Event-ID`, read from that buffer, so a dropped
+connection doesn't cost another LLM and retrieval cycle.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+
+from starlette.background import BackgroundTasks
+
+from app.config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+def parse_last_event_id(value: str) -> Tuple[str, int]:
+    """Split a `Last-Event-ID` of the form `<stream id>:<sequence>`."""
+    stream_id, separator, sequence = value.rpartition(":")
+    if not separator or not stream_id or not sequence.isdigit():
+        raise ValueError("Invalid Last-Event-ID")
+    return stream_id, int(sequence)
+
+
+class StreamBuffer:
+    """The most recent `max_events` events of one stream."""
+
+    def __init__(
+        self,
+        stream_id: str,
+        user_id: int,
+        chat_id: Optional[str],
+        max_events: int,
+        idle_timeout: float = 0.0,
+    ) -> None:
+        self.stream_id = stream_id
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.idle_timeout = idle_timeout
+        self.subscribers = 0
+        self.done = False
+        self.finished_at: Optional[float] = None
+        self.task: Optional["asyncio.Task[None]"] = None
+        self._idle_timer: Optional[asyncio.TimerHandle] = None
+        self._close_callbacks: List[Callable[[], None]] = []
+        self._events: Deque[bytes] = deque(maxlen=max(max_events, 1))
+        self._next_sequence = 0
+        self._changed = asyncio.Event()
+
+    @property
+    def first_sequence(self) -> int:
+        return self._next_sequence - len(self._events)
+
+    def append(self, data: bytes) -> None:
+        sequence = self._next_sequence
+        self._events.append(f"id: {self.stream_id}:{sequence}\n".encode() + data)
+        self._next_sequence += 1
+        self._notify()
+
+    def close(self) -> None:
+        if self.done:
+            return
+        self.done = True
+        self.finished_at = time.monotonic()
+        self._notify()
+        callbacks, self._close_callbacks = self._close_callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Stream {self.stream_id} close callback failed: {e}")
+
+    def add_close_callback(self, callback: Callable[[], None]) -> None:
+        """Call `callback` once the last event is buffered (or at once if it was)."""
+        if self.done:
+            callback()
+        else:
+            self._close_callbacks.append(callback)
+
+    def can_resume(self, last_sequence: int) -> bool:
+        """Whether every event after `last_sequence` is still buffered."""
+        return self.first_sequence <= last_sequence + 1 <= self._next_sequence
+
+    async def subscribe(self, last_sequence: int = -1) -> AsyncIterator[bytes]:
+        """Yield the events after `last_sequence`, live until the stream ends.
+
+        Events that are already buffered are sent in one write. A subscriber
+        that falls behind the buffer is disconnected; it can reconnect with
+        the last event it received.
+
+        Once the last subscriber leaves, the stream is cancelled unless a
+        client resubscribes within `idle_timeout` seconds.
+        """
+        self.subscribers += 1
+        if self._idle_timer is not None:
+            # A client is back: the countdown of an earlier drop no longer applies
+            self._idle_timer.cancel()
+            self._idle_timer = None
+        try:
+            sequence = last_sequence + 1
+            while True:
+                changed = self._changed
+                if sequence < self.first_sequence:
+                    logger.warning(f"Stream {self.stream_id} subscriber fell behind")
+                    return
+                if sequence < self._next_sequence:
+                    offset = sequence - self.first_sequence
+                    pending = [
+                        self._events[i] for i in range(offset, len(self._events))
+                    ]
+                    sequence = self._next_sequence
+                    yield b"".join(pending)
+                    continue
+                if self.done:
+                    return
+                await changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                if self.idle_timeout > 0:
+                    self._idle_timer = asyncio.get_running_loop().call_later(
+                        self.idle_timeout, self._cancel_if_idle
+                    )
+                else:
+                    self._cancel_if_idle()
+
+    def _cancel_if_idle(self) -> None:
+        self._idle_timer = None
+        if self.subscribers == 0 and not self.done and self.task is not None:
+            logger.info(f"Stream {self.stream_id} has no client, cancelling it")
+            self.task.cancel()
+
+    def _notify(self) -> None:
+        # Wake every waiting subscriber; later ones wait on a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
+class StreamRegistry:
+    """In-flight and recently finished streams of this process."""
+
+    def __init__(
+        self,
+        max_streams: int,
+        max_events: int,
+        ttl_seconds: float,
+        idle_timeout: float = 0.0,
+    ) -> None:
+        self.max_streams = max_streams
+        self.max_events = max_events
+        self.ttl_seconds = ttl_seconds
+        self.idle_timeout = idle_timeout
+        self._streams: "OrderedDict[str, StreamBuffer]" = OrderedDict()
+        self._chat_streams: Dict[str, str] = {}
+        self.started = 0
+        self.resumed = 0
+        self.evicted = 0
+        self.cancelled = 0
+
+    def start(
+        self,
+        events: AsyncIterator[bytes],
+        user_id: int,
+        chat_id: Optional[str] = None,
+        background: Optional[BackgroundTasks] = None,
+    ) -> StreamBuffer:
+        """Run `events` in a task that fills a new buffer, and return it.
+
+        `background` tasks (e.g. persisting the reply) run after the stream
+        ends, whether or not a client is still connected; close callbacks run
+        before them.
+        """
+        self._evict()
+        buffer = StreamBuffer(
+            uuid.uuid4().hex, user_id, chat_id, self.max_events, self.idle_timeout
+        )
+        self._streams[buffer.stream_id] = buffer
+        if chat_id is not None:
+            self._chat_streams[chat_id] = buffer.stream_id
+        buffer.task = asyncio.create_task(self._produce(buffer, events, background))
+        # Also closes a buffer whose task was cancelled before it started
+        buffer.task.add_done_callback(lambda _: buffer.close())
+        self.started += 1
+        return buffer
+
+    def get(self, stream_id: str, user_id: int) -> Optional[StreamBuffer]:
+        self._evict()
+        buffer = self._streams.get(stream_id)
+        if buffer is None or buffer.user_id != user_id:
+            return None
+        return buffer
+
+    def latest_for_chat(self, chat_id: str, user_id: int) -> Optional[StreamBuffer]:
+        stream_id = self._chat_streams.get(chat_id)
+        return self.get(stream_id, user_id) if stream_id is not None else None
+
+    def record_resume(self) -> None:
+        self.resumed += 1
+
+    async def run_evictor(self, interval: float) -> None:
+        """Evict expired streams every `interval` seconds, even without traffic."""
+        while True:
+            await asyncio.sleep(interval)
+            self._evict()
+
+    async def close(self) -> None:
+        """Cancel the streams still running (on shutdown)."""
+        tasks = [buffer.task for buffer in self._streams.values() if buffer.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        active = sum(1 for buffer in self._streams.values() if not buffer.done)
+        return {
+            "active": active,
+            "buffered": len(self._streams),
+            "started": self.started,
+            "resumed": self.resumed,
+            "evicted": self.evicted,
+            "cancelled": self.cancelled,
+        }
+
+    async def _produce(
+        self,
+        buffer: StreamBuffer,
+        events: AsyncIterator[bytes],
+        background: Optional[BackgroundTasks],
+    ) -> None:
+        try:
+            async for data in events:
+                buffer.append(data)
+        except asyncio.CancelledError:
+            # Cancelling closed the upstream calls; persistence still runs
+            self.cancelled += 1
+        except Exception as e:
+            logger.error(f"Stream {buffer.stream_id} failed: {e}", exc_info=True)
+        finally:
+            buffer.close()
+
+        if background is not None:
+            try:
+                await background()
+            except Exception as e:
+                logger.error(
+                    f"Stream {buffer.stream_id} background task failed: {e}",
+                    exc_info=True,
+                )
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        finished = [
+            buffer
+            for buffer in self._streams.values()
+            if buffer.finished_at is not None
+        ]
+        overflow = len(self._streams) - self.max_streams
+        for buffer in finished:  # oldest first
+            expired = now - buffer.finished_at >= self.ttl_seconds  # type: ignore[operator]
+            if not expired and overflow <= 0:
+                continue
+            del self._streams[buffer.stream_id]
+            chat_id = buffer.chat_id
+            if (
+                chat_id is not None
+                and self._chat_streams.get(chat_id) == buffer.stream_id
+            ):
+                del self._chat_streams[chat_id]
+            overflow -= 1
+            self.evicted += 1
+
+
+stream_registry = StreamRegistry(
+    get_settings().STREAM_BUFFER_MAX_STREAMS,
+    get_settings().STREAM_BUFFER_MAX_EVENTS,
+    get_settings().STREAM_BUFFER_TTL_SECONDS,
+    get_settings().STREAM_IDLE_TIMEOUT_SECONDS,
+)
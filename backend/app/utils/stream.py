@@ -0,0 +1,213 @@
+"""UI messages and their stream chunks: accumulation and SSE encoding at the edge."""
+
+import asyncio
+import json
+from functools import lru_cache
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional
+
+try:
+    import orjson  # optional dependency, faster encoding when installed
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+# One part of the Vercel AI SDK UI message stream, e.g.
+# {"type": "text-delta", "id": "text-1", "delta": "..."}
+UIMessageChunk = Dict[str, Any]
+
+DONE_EVENT = b"data: [DONE]\n\n"
+
+
+def ui_message_text(message: Dict[str, Any]) -> str:
+    """Concatenate the text parts of a stored UIMessage."""
+    return "".join(
+        part.get("text", "")
+        for part in message.get("parts", [])
+        if part.get("type") == "text"
+    )
+
+
+def _dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+@lru_cache(maxsize=256)
+def _text_delta_prefix(text_id: str) -> bytes:
+    return b'data: {"type":"text-delta","id":' + _dumps(text_id) + b',"delta":'
+
+
+def encode_sse(chunk: UIMessageChunk) -> bytes:
+    """Encode a chunk as one SSE `data:` event.
+
+    Text deltas, by far the most frequent chunk, reuse a pre-built prefix per
+    text part so only the delta itself is escaped.
+    """
+    if chunk.get("type") == "text-delta" and len(chunk) == 3:
+        return _text_delta_prefix(chunk["id"]) + _dumps(chunk["delta"]) + b"}\n\n"
+    return b"data: " + _dumps(chunk) + b"\n\n"
+
+
+async def coalesce_text_deltas(
+    chunks: AsyncIterator[UIMessageChunk],
+    max_delay: float,
+    max_chars: int,
+) -> AsyncIterator[UIMessageChunk]:
+    """Merge consecutive deltas of a text part into fewer, larger chunks.
+
+    Pending text is sent once it reaches `max_chars` (0 for no limit),
+    `max_delay` seconds after its first delta, or right before any other
+    chunk, so coalescing never holds text back longer than `max_delay`.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = chunks.__aiter__()
+    pending: Optional[List[str]] = None
+    pending_id = None
+    pending_chars = 0
+    deadline = 0.0
+    next_chunk: Optional["asyncio.Task[UIMessageChunk]"] = None
+
+    def flush() -> UIMessageChunk:
+        nonlocal pending
+        delta = "".join(pending or ())
+        pending = None
+        return {"type": "text-delta", "id": pending_id, "delta": delta}
+
+    async def read_next() -> UIMessageChunk:
+        return await iterator.__anext__()
+
+    try:
+        while True:
+            try:
+                if pending is None and next_chunk is None:
+                    chunk = await iterator.__anext__()
+                else:
+                    # Wait for the next chunk only until the pending text is due
+                    if next_chunk is None:
+                        next_chunk = asyncio.ensure_future(read_next())
+                    if pending is not None:
+                        timeout = deadline - loop.time()
+                        if timeout > 0:
+                            await asyncio.wait((next_chunk,), timeout=timeout)
+                        if not next_chunk.done():
+                            yield flush()
+                            continue
+                    chunk = await next_chunk
+                    next_chunk = None
+            except StopAsyncIteration:
+                break
+
+            if chunk.get("type") == "text-delta":
+                if pending is not None and chunk["id"] != pending_id:
+                    yield flush()
+                if pending is None:
+                    pending = []
+                    pending_id = chunk["id"]
+                    pending_chars = 0
+                    deadline = loop.time() + max_delay
+                pending.append(chunk["delta"])
+                pending_chars += len(chunk["delta"])
+                if 0 < max_chars <= pending_chars:
+                    yield flush()
+                continue
+
+            if pending is not None:
+                yield flush()
+            yield chunk
+
+        if pending is not None:
+            yield flush()
+    finally:
+        if next_chunk is not None:
+            # Let the source finish its cleanup (e.g. closing upstream calls)
+            next_chunk.cancel()
+            await asyncio.gather(next_chunk, return_exceptions=True)
+
+
+async def sse_stream(
+    chunks: AsyncIterator[UIMessageChunk],
+    coalesce_max_delay: float = 0.0,
+    coalesce_max_chars: int = 0,
+) -> AsyncGenerator[bytes, None]:
+    """Serialise chunks as Server-Sent Events, ending with `[DONE]`.
+
+    With a positive `coalesce_max_delay`, text deltas are merged by
+    `coalesce_text_deltas` first, so a long answer takes fewer writes.
+    """
+    if coalesce_max_delay > 0:
+        chunks = coalesce_text_deltas(chunks, coalesce_max_delay, coalesce_max_chars)
+    async for chunk in chunks:
+        yield encode_sse(chunk)
+    yield DONE_EVENT
+
+
+class UIMessageAccumulator:
+    """Build the assistant UIMessage (text and tool parts) from its chunks."""
+
+    def __init__(self) -> None:
+        self.message_id: Optional[str] = None
+        self.metadata: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self._parts: List[Dict[str, Any]] = []
+        self._texts: Dict[str, List[str]] = {}
+        self._tools: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, chunk: UIMessageChunk) -> None:
+        kind = chunk.get("type")
+        if kind == "text-delta":
+            self._text(chunk["id"]).append(chunk["delta"])
+        elif kind == "text-start":
+            self._text(chunk["id"])
+        elif kind == "start":
+            self.message_id = chunk.get("messageId")
+        elif kind in ("tool-input-start", "tool-input-available"):
+            part = self._tool(chunk["toolCallId"], chunk["toolName"])
+            if "input" in chunk:
+                part["state"] = "input-available"
+                part["input"] = chunk["input"]
+        elif kind == "tool-output-available":
+            part = self._tools.get(chunk["toolCallId"])
+            if part is not None:
+                part["state"] = "output-available"
+                part["output"] = chunk["output"]
+        elif kind == "finish":
+            self.metadata.update(chunk.get("messageMetadata") or {})
+        elif kind == "error":
+            self.error = chunk.get("errorText")
+
+    def message(self, fallback_id: str) -> Dict[str, Any]:
+        parts = []
+        for part in self._parts:
+            if part["type"] == "text":
+                text = "".join(self._texts[part["id"]])
+                if text:
+                    parts.append({"type": "text", "text": text})
+            else:
+                parts.append(part)
+
+        message: Dict[str, Any] = {
+            "id": self.message_id or fallback_id,
+            "role": "assistant",
+            "parts": parts or [{"type": "text", "text": ""}],
+        }
+        if self.metadata:
+            message["metadata"] = self.metadata
+        return message
+
+    def _text(self, text_id: str) -> List[str]:
+        if text_id not in self._texts:
+            self._texts[text_id] = []
+            self._parts.append({"type": "text", "id": text_id})
+        return self._texts[text_id]
+
+    def _tool(self, tool_call_id: str, tool_name: str) -> Dict[str, Any]:
+        part = self._tools.get(tool_call_id)
+        if part is None:
+            part = {
+                "type": f"tool-{tool_name}",
+                "toolCallId": tool_call_id,
+                "state": "input-streaming",
+            }
+            self._tools[tool_call_id] = part
+            self._parts.append(part)
+        return part
@@ -0,0 +1,6 @@
+"""Cheap token estimates for prompt budgeting (no tokenizer dependency)."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: about 4 characters per token."""
+    return (len(text) + 3) // 4
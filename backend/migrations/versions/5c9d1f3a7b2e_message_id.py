@@ -0,0 +1,39 @@
+"""add message_id to message
+
+Revision ID: 5c9d1f3a7b2e
+Revises: 3e7a4a42b100
+Create Date: 2026-10-17 10:12:41.508113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c9d1f3a7b2e'
+down_revision: Union[str, Sequence[str], None] = '3e7a4a42b100'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('message', sa.Column('message_id', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    # Existing rows keep the UIMessage id they were saved with
+    op.execute("UPDATE message SET message_id = COALESCE(data->>'id', 'msg-' || id::text)")
+    # Keep only the first copy of any message saved twice in the same chat
+    op.execute(
+        "DELETE FROM message a USING message b "
+        "WHERE a.chat_id = b.chat_id AND a.message_id = b.message_id AND a.id > b.id"
+    )
+    op.alter_column('message', 'message_id', nullable=False)
+    op.create_unique_constraint('uq_message_chat_id_message_id', 'message', ['chat_id', 'message_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_message_chat_id_message_id', 'message', type_='unique')
+    op.drop_column('message', 'message_id')
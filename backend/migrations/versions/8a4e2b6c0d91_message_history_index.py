@@ -0,0 +1,29 @@
+"""index message history by chat, created_at and id
+
+Revision ID: 8a4e2b6c0d91
+Revises: 5c9d1f3a7b2e
+Create Date: 2026-10-17 11:03:27.194652
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a4e2b6c0d91'
+down_revision: Union[str, Sequence[str], None] = '5c9d1f3a7b2e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_message_chat_id_created_at_id', 'message', ['chat_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_message_chat_id_created_at_id', table_name='message')
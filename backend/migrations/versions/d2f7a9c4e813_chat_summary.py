@@ -0,0 +1,33 @@
+"""add rolling summary to chat
+
+Revision ID: d2f7a9c4e813
+Revises: 8a4e2b6c0d91
+Create Date: 2026-10-17 11:47:05.338920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f7a9c4e813'
+down_revision: Union[str, Sequence[str], None] = '8a4e2b6c0d91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat', sa.Column('summary', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.add_column('chat', sa.Column('summary_until_id', sa.Integer(), nullable=True))
+    op.add_column('chat', sa.Column('summary_source_tokens', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat', 'summary_source_tokens')
+    op.drop_column('chat', 'summary_until_id')
+    op.drop_column('chat', 'summary')
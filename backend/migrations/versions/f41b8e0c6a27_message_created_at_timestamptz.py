@@ -0,0 +1,44 @@
+"""store message.created_at as timestamptz
+
+Revision ID: f41b8e0c6a27
+Revises: d2f7a9c4e813
+Create Date: 2026-10-18 09:21:54.072316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f41b8e0c6a27'
+down_revision: Union[str, Sequence[str], None] = 'd2f7a9c4e813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing values were written as UTC
+    op.alter_column(
+        'message',
+        'created_at',
+        type_=sa.DateTime(timezone=True),
+        existing_type=sa.DateTime(),
+        existing_nullable=False,
+        postgresql_using="created_at AT TIME ZONE 'UTC'",
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column(
+        'message',
+        'created_at',
+        type_=sa.DateTime(),
+        existing_type=sa.DateTime(timezone=True),
+        existing_nullable=False,
+        postgresql_using="created_at AT TIME ZONE 'UTC'",
+    )
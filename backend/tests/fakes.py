@@ -0,0 +1,127 @@
+"""Scripted stand-ins for the AsyncOpenAI streaming client."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Sequence
+
+
+def completion_chunk(
+    content: Optional[str] = None,
+    tool_calls: Optional[List[Any]] = None,
+    finish_reason: Optional[str] = None,
+) -> SimpleNamespace:
+    """A `ChatCompletionChunk` with a single choice."""
+    delta = SimpleNamespace(content=content, tool_calls=tool_calls)
+    choice = SimpleNamespace(delta=delta, finish_reason=finish_reason)
+    return SimpleNamespace(choices=[choice], usage=None)
+
+
+def usage_chunk(prompt_tokens: int, completion_tokens: int) -> SimpleNamespace:
+    """The trailing usage-only chunk sent with `include_usage`."""
+    usage = SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens,
+    )
+    return SimpleNamespace(choices=[], usage=usage)
+
+
+def tool_call_delta(
+    index: int,
+    call_id: Optional[str] = None,
+    name: Optional[str] = None,
+    arguments: Optional[str] = None,
+) -> SimpleNamespace:
+    """A streamed fragment of the tool call at `index`."""
+    function = SimpleNamespace(name=name, arguments=arguments)
+    return SimpleNamespace(index=index, id=call_id, function=function)
+
+
+def tool_round(calls: Sequence[tuple[str, Dict[str, Any]]]) -> List[SimpleNamespace]:
+    """A completion that calls each `(name, arguments)` tool, in order."""
+    chunks = []
+    for index, (name, arguments) in enumerate(calls):
+        chunks.append(
+            completion_chunk(tool_calls=[tool_call_delta(index, f"call_{index}", name)])
+        )
+        chunks.append(
+            completion_chunk(
+                tool_calls=[tool_call_delta(index, arguments=json.dumps(arguments))]
+            )
+        )
+    chunks.append(completion_chunk(finish_reason="tool_calls"))
+    chunks.append(usage_chunk(10, 5))
+    return chunks
+
+
+def answer_round(*deltas: str) -> List[SimpleNamespace]:
+    """A completion that answers with the given text deltas."""
+    chunks = [completion_chunk(content=delta) for delta in deltas]
+    chunks.append(completion_chunk(finish_reason="stop"))
+    chunks.append(usage_chunk(20, 7))
+    return chunks
+
+
+class FakeStream:
+    """An `AsyncStream` over scripted chunks that records whether it was closed."""
+
+    def __init__(self, chunks: Sequence[Any], hang: bool = False) -> None:
+        self.chunks = list(chunks)
+        self.hang = hang
+        self.drained = False
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(0)
+            yield chunk
+        self.drained = True
+        if self.hang:
+            await asyncio.Event().wait()
+
+    async def close(self) -> None:
+        self.closed = True
+
+    async def __aenter__(self) -> "FakeStream":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+
+class FakeOpenAI:
+    """Answers each `chat.completions.create` call with the next scripted stream."""
+
+    def __init__(self, *streams: FakeStream) -> None:
+        self.streams = list(streams)
+        self.requests: List[Dict[str, Any]] = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs: Any) -> FakeStream:
+        self.requests.append(kwargs)
+        return self.streams.pop(0)
+
+
+class FakeSemanticCache:
+    """Records the questions probed and the answers stored."""
+
+    def __init__(self, answer: Optional[str] = None) -> None:
+        self.answer = answer
+        self.questions: List[str] = []
+        self.stored: List[str] = []
+
+    def probe(self, question: str) -> SimpleNamespace:
+        self.questions.append(question)
+        return SimpleNamespace(answer=self.answer)
+
+    def store(self, probe: Any, answer: str) -> None:
+        self.stored.append(answer)
+
+
+async def collect(chunks) -> List[Dict[str, Any]]:
+    """Drain an async iterator of UI message chunks into a list."""
+    return [chunk async for chunk in chunks]
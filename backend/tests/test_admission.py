@@ -0,0 +1,104 @@
+"""Tests for admission control of chat streams."""
+
+import asyncio
+
+import pytest
+
+from app.utils.admission import AdmissionController, AdmissionRejected
+
+
+def controller(**limits) -> AdmissionController:
+    defaults = {
+        "max_streams": 1,
+        "max_streams_per_user": 0,
+        "max_waiters": 1,
+        "queue_timeout": 0.05,
+        "rate_per_minute": 0,
+        "burst": 1,
+    }
+    return AdmissionController(**{**defaults, **limits})
+
+
+def test_waiter_gets_the_released_slot_and_full_queue_is_rejected():
+    """Test that a queued request takes a freed slot and extra ones get 503."""
+
+    async def scenario():
+        admission = controller(queue_timeout=1)
+        first = await admission.admit(user_id=1)
+        waiting = asyncio.ensure_future(admission.admit(user_id=2))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.admit(user_id=3)
+        first.release()
+        second = await waiting
+        assert admission.stats()["active"] == 1
+        second.release()
+        return rejected.value, admission.stats()
+
+    rejected, stats = asyncio.run(scenario())
+
+    assert rejected.status_code == 503
+    assert rejected.headers == {"Retry-After": "1"}
+    assert stats["active"] == 0
+    assert stats["rejected"]["queue_full"] == 1
+
+
+def test_queue_timeout_is_rejected_with_503():
+    """Test that a request still queued after the timeout gets a 503."""
+
+    async def scenario():
+        admission = controller()
+        await admission.admit(user_id=1)
+        await admission.admit(user_id=2)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        asyncio.run(scenario())
+
+    assert rejected.value.status_code == 503
+
+
+def test_user_limit_and_rate_limit_are_rejected_with_429():
+    """Test that per-user concurrency and the token bucket answer 429.
+
+    Requests rejected by the concurrency limit get their token back.
+    """
+
+    async def scenario():
+        admission = controller(
+            max_streams=0, max_streams_per_user=1, rate_per_minute=60, burst=2
+        )
+        slot = await admission.admit(user_id=1)
+        with pytest.raises(AdmissionRejected) as user_limit:
+            await admission.admit(user_id=1)
+        slot.release()
+        # The rejected request didn't use up the second token
+        (await admission.admit(user_id=1)).release()
+        with pytest.raises(AdmissionRejected) as rate_limit:
+            await admission.admit(user_id=1)
+        return user_limit.value, rate_limit.value
+
+    user_limit, rate_limit = asyncio.run(scenario())
+
+    assert user_limit.status_code == rate_limit.status_code == 429
+    assert 0 < rate_limit.retry_after <= 1
+    assert rate_limit.headers == {"Retry-After": "1"}
+
+
+def test_wrapped_stream_releases_its_slot():
+    """Test that a directly streamed response frees its slot, even unstarted."""
+
+    async def events():
+        yield b"data: x\n\n"
+
+    async def scenario():
+        admission = controller()
+        slot = await admission.admit(user_id=1)
+        assert [data async for data in slot.wrap(events())] == [b"data: x\n\n"]
+        finished = admission.stats()["active"]
+
+        slot = await admission.admit(user_id=1)
+        unstarted = slot.wrap(events())
+        del unstarted
+        return finished, admission.stats()["active"]
+
+    assert asyncio.run(scenario()) == (0, 0)
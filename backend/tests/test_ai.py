@@ -0,0 +1,410 @@
+"""Tests for the tool-calling rounds of stream_text and how tools are run."""
+
+import asyncio
+import contextlib
+import json
+import threading
+import time
+
+import pytest
+from fastapi import BackgroundTasks
+
+from app.config.settings import get_settings
+from app.services.speculative import speculation_stats
+from app.utils import ai
+from app.utils.ai import (
+    execute_tool_call,
+    shutdown_tool_executor,
+    stream_text,
+    stream_text_with_persistence,
+)
+from tests.fakes import (
+    FakeOpenAI,
+    FakeSemanticCache,
+    FakeStream,
+    answer_round,
+    collect,
+    completion_chunk,
+    tool_round,
+)
+
+QUESTION = [
+    {"role": "system", "content": "..."},
+    {"role": "user", "content": "Quando é a prova?"},
+]
+TOOLS = {"search_edital": lambda query: f"trechos sobre {query}"}
+SEARCHES = [
+    ("search_edital", {"query": "data da prova"}),
+    ("search_edital", {"query": "local da prova"}),
+]
+
+
+@pytest.fixture
+def max_rounds(monkeypatch):
+    def set_max_rounds(rounds: int) -> None:
+        monkeypatch.setattr(get_settings(), "TOOL_MAX_ROUNDS", rounds)
+
+    return set_max_rounds
+
+
+def _run(client, cache=None):
+    return asyncio.run(
+        collect(
+            stream_text(
+                client,
+                QUESTION,
+                [],
+                TOOLS,
+                "gpt-test",
+                semantic_cache=cache,
+                first_turn=cache is not None,
+            )
+        )
+    )
+
+
+def _events(chunks, *skip):
+    return [
+        (chunk["type"], chunk.get("toolCallId"))
+        for chunk in chunks
+        if chunk["type"] not in skip
+    ]
+
+
+def test_tool_round_is_framed_as_steps(max_rounds):
+    """Test that a tool round and the answer round stream as two framed steps."""
+    max_rounds(2)
+    client = FakeOpenAI(
+        FakeStream(tool_round(SEARCHES)),
+        FakeStream(answer_round("Em ", "outubro.")),
+    )
+
+    chunks = _run(client)
+
+    # Results are sent as each tool finishes, so their order is not fixed
+    assert _events(chunks, "tool-output-available") == [
+        ("start", None),
+        ("start-step", None),
+        ("tool-input-start", "call_0"),
+        ("tool-input-delta", "call_0"),
+        # The first call is complete as soon as the second one starts
+        ("tool-input-available", "call_0"),
+        ("tool-input-start", "call_1"),
+        ("tool-input-delta", "call_1"),
+        ("tool-input-available", "call_1"),
+        ("finish-step", None),
+        ("start-step", None),
+        ("text-start", None),
+        ("text-delta", None),
+        ("text-delta", None),
+        ("text-end", None),
+        ("finish-step", None),
+        ("finish", None),
+    ]
+    outputs = _events(chunks)[8:10]
+    assert sorted(outputs) == [
+        ("tool-output-available", "call_0"),
+        ("tool-output-available", "call_1"),
+    ]
+    assert chunks[4]["input"] == {"query": "data da prova"}
+    assert chunks[-1]["messageMetadata"] == {
+        "finishReason": "stop",
+        "usage": {"promptTokens": 30, "completionTokens": 12, "totalTokens": 42},
+    }
+
+
+def test_last_round_is_requested_without_tools(max_rounds):
+    """Test that tools are offered for the capped rounds, then tool_choice is none."""
+    max_rounds(2)
+    client = FakeOpenAI(
+        FakeStream(tool_round(SEARCHES[:1])),
+        FakeStream(tool_round(SEARCHES[1:])),
+        FakeStream(answer_round("Em outubro.")),
+    )
+
+    chunks = _run(client)
+
+    assert [request["tool_choice"] for request in client.requests] == [
+        "auto",
+        "auto",
+        "none",
+    ]
+    assert [chunk["type"] for chunk in chunks].count("start-step") == 3
+    # Each round sees the tool results of the rounds before it
+    assert [message["role"] for message in client.requests[2]["messages"]] == [
+        "system",
+        "user",
+        "assistant",
+        "tool",
+        "assistant",
+        "tool",
+    ]
+
+
+def test_round_cap_stops_a_model_that_keeps_calling_tools(max_rounds):
+    """Test that no more completions are requested once the round cap is reached."""
+    max_rounds(1)
+    client = FakeOpenAI(
+        FakeStream(tool_round(SEARCHES[:1])),
+        FakeStream(tool_round(SEARCHES[1:])),
+        FakeStream(answer_round("nunca pedido")),
+    )
+
+    chunks = _run(client)
+
+    assert len(client.requests) == 2
+    assert len(client.streams) == 1
+    # Calls made in the last round are never run
+    assert _events(chunks).count(("tool-output-available", "call_0")) == 1
+    assert chunks[-1]["messageMetadata"]["finishReason"] == "tool-calls"
+
+
+def test_only_the_final_round_text_is_cached(max_rounds):
+    """Test that the text streamed before a tool call is not stored as the answer."""
+    max_rounds(2)
+    cache = FakeSemanticCache()
+    client = FakeOpenAI(
+        FakeStream(
+            [completion_chunk(content="Vou consultar o edital. ")]
+            + tool_round(SEARCHES[:1])
+        ),
+        FakeStream(answer_round("Em ", "outubro.")),
+    )
+
+    chunks = _run(client, cache)
+
+    assert cache.questions == ["Quando é a prova?"]
+    assert cache.stored == ["Em outubro."]
+    assert [chunk["id"] for chunk in chunks if chunk["type"] == "text-start"] == [
+        "text-1",
+        "text-2",
+    ]
+
+
+def test_incomplete_answer_is_not_cached(max_rounds):
+    """Test that an answer cut off before `stop` is not stored."""
+    max_rounds(0)
+    cache = FakeSemanticCache()
+    client = FakeOpenAI(
+        FakeStream(
+            [completion_chunk(content="Em "), completion_chunk(finish_reason="length")]
+        )
+    )
+
+    _run(client, cache)
+
+    assert client.requests[0]["tool_choice"] == "none"
+    assert cache.stored == []
+
+
+def _tool_messages(request):
+    return [
+        (message["tool_call_id"], json.loads(message["content"]))
+        for message in request["messages"]
+        if message["role"] == "tool"
+    ]
+
+
+def test_tool_results_return_to_the_model_in_call_order(max_rounds):
+    """Test that tool messages follow call order even when a later call ends first."""
+    max_rounds(1)
+    tools = {
+        "slow": lambda: time.sleep(0.2) or "slow result",
+        "fast": lambda: "fast result",
+    }
+    client = FakeOpenAI(
+        FakeStream(tool_round([("slow", {}), ("fast", {})])),
+        FakeStream(answer_round("ok")),
+    )
+
+    chunks = asyncio.run(collect(stream_text(client, QUESTION, [], tools, "gpt-test")))
+
+    outputs = [
+        chunk["toolCallId"]
+        for chunk in chunks
+        if chunk["type"] == "tool-output-available"
+    ]
+    assert outputs == ["call_1", "call_0"]
+    assert _tool_messages(client.requests[1]) == [
+        ("call_0", "slow result"),
+        ("call_1", "fast result"),
+    ]
+
+
+def test_hung_tool_times_out_with_an_error_result(max_rounds, monkeypatch):
+    """Test that a tool past TOOL_TIMEOUT_SECONDS is answered with an error."""
+    max_rounds(1)
+    monkeypatch.setattr(get_settings(), "TOOL_TIMEOUT_SECONDS", 0.1)
+    release = threading.Event()
+    tools = {"hang": lambda: release.wait(5.0), "fast": lambda: "fast result"}
+    client = FakeOpenAI(
+        FakeStream(tool_round([("hang", {}), ("fast", {})])),
+        FakeStream(answer_round("ok")),
+    )
+
+    try:
+        chunks = asyncio.run(
+            collect(stream_text(client, QUESTION, [], tools, "gpt-test"))
+        )
+    finally:
+        release.set()
+
+    assert chunks[-1]["messageMetadata"]["finishReason"] == "stop"
+    assert _tool_messages(client.requests[1]) == [
+        ("call_0", {"error": "Tool 'hang' timed out after 0.1s."}),
+        ("call_1", "fast result"),
+    ]
+
+
+def test_tool_concurrency_is_capped(max_rounds, monkeypatch):
+    """Test that no more than TOOL_MAX_CONCURRENCY tools run at once."""
+    max_rounds(1)
+    monkeypatch.setattr(get_settings(), "TOOL_MAX_CONCURRENCY", 2)
+    lock = threading.Lock()
+    running = 0
+    peak = 0
+
+    def slow_tool():
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        return "done"
+
+    calls = [("slow", {}) for _ in range(5)]
+    client = FakeOpenAI(FakeStream(tool_round(calls)), FakeStream(answer_round("ok")))
+
+    asyncio.run(
+        collect(stream_text(client, QUESTION, [], {"slow": slow_tool}, "gpt-test"))
+    )
+
+    assert peak == 2
+    assert [result for _, result in _tool_messages(client.requests[1])] == ["done"] * 5
+
+
+def test_tools_run_again_after_the_executor_is_shut_down():
+    """Test that a shutdown (one app lifespan ending) doesn't break later calls."""
+    shutdown_tool_executor()
+
+    result = asyncio.run(
+        execute_tool_call(TOOLS, "search_edital", '{"query": "vagas"}', 1.0)
+    )
+
+    assert result == "trechos sobre vagas"
+
+
+class CancellationProbe:
+    """Hangs every tool call and records the saved turn, to cancel mid-stream."""
+
+    def __init__(self, monkeypatch) -> None:
+        self.started: list[tuple[str, str]] = []
+        self.cancelled: list[tuple[str, str]] = []
+        self.aborted: list[tuple[str, str]] = []
+        self.saved: list[list[dict]] = []
+        monkeypatch.setattr(get_settings(), "SPECULATIVE_RETRIEVAL_ENABLED", True)
+        monkeypatch.setattr(ai, "execute_tool_call", self.execute_tool_call)
+        monkeypatch.setattr(ai, "new_session", contextlib.nullcontext)
+        monkeypatch.setattr(ai, "save_chat", self.save_chat)
+        monkeypatch.setattr(ai, "update_chat_summary", self.update_chat_summary)
+
+    async def execute_tool_call(self, tools, name, raw_arguments, *args):
+        call = (name, json.loads(raw_arguments)["query"])
+        self.started.append(call)
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            self.cancelled.append(call)
+            raise
+
+    async def save_chat(self, session, chat_id, user_id, messages):
+        self.saved.append(messages)
+
+    async def update_chat_summary(self, *args):
+        pass
+
+    def run(self, client, cancel_when) -> None:
+        """Stream a chat turn, cancel it once `cancel_when()` holds, then persist."""
+
+        async def scenario():
+            persist_tasks = BackgroundTasks()
+            chunks = stream_text_with_persistence(
+                client,
+                QUESTION,
+                [],
+                TOOLS,
+                "gpt-test",
+                "data",
+                [{"id": "msg-user", "role": "user", "parts": []}],
+                "chat-1",
+                1,
+                persist_tasks,
+            )
+            consumer = asyncio.ensure_future(collect(chunks))
+            async with asyncio.timeout(1.0):
+                while not cancel_when():
+                    await asyncio.sleep(0.01)
+            consumer.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await consumer
+            # Let the cancellations land, but before asyncio.run cancels leftovers
+            await asyncio.sleep(0.01)
+            self.aborted = sorted(self.cancelled)
+            await persist_tasks()
+
+        asyncio.run(scenario())
+
+    @property
+    def reply(self) -> dict:
+        [messages] = self.saved
+        return messages[-1]
+
+
+SPECULATION = ("search_edital", "Quando é a prova?")
+
+
+def test_cancelling_mid_completion_closes_upstream_and_saves_the_partial_reply(
+    max_rounds, monkeypatch
+):
+    """Test that a cancelled completion is closed and its partial text saved."""
+    max_rounds(1)
+    probe = CancellationProbe(monkeypatch)
+    upstream = FakeStream([completion_chunk(content="A prova ")], hang=True)
+    client = FakeOpenAI(upstream)
+    wasted = speculation_stats.snapshot()["wasted"]
+
+    probe.run(client, lambda: probe.started and upstream.drained)
+
+    assert upstream.closed
+    assert probe.aborted == [SPECULATION]
+    assert speculation_stats.snapshot()["wasted"] == wasted + 1
+    assert probe.reply["parts"] == [{"type": "text", "text": "A prova "}]
+    assert probe.reply["metadata"] == {"finishReason": "cancelled"}
+
+
+def test_cancelling_during_tool_calls_cancels_them_and_saves_the_calls(
+    max_rounds, monkeypatch
+):
+    """Test that tool calls still running when the stream is cancelled are aborted."""
+    max_rounds(1)
+    probe = CancellationProbe(monkeypatch)
+    upstream = FakeStream(tool_round([("search_edital", {"query": "gabarito"})]))
+    client = FakeOpenAI(upstream)
+    model_call = ("search_edital", "gabarito")
+
+    probe.run(client, lambda: model_call in probe.started)
+
+    assert upstream.closed
+    assert probe.aborted == sorted([SPECULATION, model_call])
+    assert len(client.requests) == 1
+    assert probe.reply["parts"] == [
+        {
+            "type": "tool-search_edital",
+            "toolCallId": "call_0",
+            "state": "input-available",
+            "input": {"query": "gabarito"},
+        }
+    ]
+    assert probe.reply["metadata"] == {"finishReason": "cancelled"}
@@ -0,0 +1,92 @@
+"""Tests for resolving the authenticated user."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config.auth import JWT_ALG
+from app.config.settings import get_settings
+from app.main import app
+from app.models import User
+from app.repositories import auth as auth_repository
+from app.repositories.auth import get_or_create_user, user_cache
+from app.utils.auth import create_jwt
+
+PROFILE = {"id": 42, "login": "octocat", "name": "Octo", "avatar_url": None}
+
+
+def _client(claims=None) -> TestClient:
+    token = create_jwt(get_settings(), "42", JWT_ALG, 5, claims)
+    return TestClient(app, cookies={"access_token": token})
+
+
+@pytest.fixture
+def no_database(monkeypatch):
+    """Fail the test if a database session is opened."""
+
+    def new_session():
+        raise AssertionError("no database session expected")
+
+    monkeypatch.setattr(auth_repository, "new_session", new_session)
+    user_cache.delete("42")
+    yield
+    user_cache.delete("42")
+
+
+def test_profile_claims_need_no_database(no_database):
+    """Test that a token carrying the profile is resolved from its claims."""
+    claims = {key: value for key, value in PROFILE.items() if key != "id"}
+
+    response = _client(claims).get("/auth/me")
+
+    assert response.status_code == 200
+    assert response.json() == PROFILE
+
+
+def test_id_only_token_is_served_from_the_user_cache(no_database):
+    """Test that a legacy token is resolved from user_cache without a query."""
+    user_cache.set("42", PROFILE)
+
+    response = _client().get("/auth/me")
+
+    assert response.status_code == 200
+    assert response.json() == PROFILE
+
+
+class FakeSession:
+    """Returns `user` from every query and records commits."""
+
+    def __init__(self, user: User) -> None:
+        self.user = user
+        self.commits = 0
+
+    async def exec(self, statement):
+        return SimpleNamespace(first=lambda: self.user)
+
+    def add(self, instance) -> None:
+        pass
+
+    async def commit(self) -> None:
+        self.commits += 1
+
+
+@pytest.mark.parametrize(
+    ("github_name", "invalidated"), [("Octo", False), ("Octocat", True)]
+)
+def test_profile_change_invalidates_the_cached_user(github_name, invalidated):
+    """Test that only a changed GitHub profile drops the cached entry."""
+    user = User(id=42, login="octocat", name="Octo", github_id=1)
+    session = FakeSession(user)
+    user_cache.set("42", PROFILE)
+    github_info = {"id": 1, "login": "octocat", "name": github_name}
+
+    try:
+        asyncio.run(get_or_create_user(session, github_info))  # type: ignore[arg-type]
+
+        assert (user_cache.get("42") is None) == invalidated
+        assert session.commits == int(invalidated)
+        assert user.name == github_name
+    finally:
+        user_cache.delete("42")
@@ -0,0 +1,53 @@
+"""Tests for the in-process LRU/TTL cache."""
+
+import time
+
+from app.utils.cache import RedisCacheStore, TTLCache
+
+
+def test_cache_evicts_least_recently_used():
+    """Test that the oldest untouched entry is evicted past max_entries."""
+    cache: TTLCache[str] = TTLCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_expires_entries_after_ttl():
+    """Test that entries are misses once their TTL has elapsed."""
+    cache: TTLCache[str] = TTLCache(max_entries=10, ttl_seconds=0.01)
+    cache.set("a", "1")
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_cache_delete_invalidates_entry():
+    """Test that a deleted entry is a miss until set again."""
+    cache: TTLCache[str] = TTLCache(max_entries=10, ttl_seconds=60)
+    cache.set("a", "1")
+    cache.delete("a")
+
+    assert cache.get("a") is None
+    cache.set("a", "2")
+    assert cache.get("a") == "2"
+
+
+def test_cache_falls_back_to_local_when_shared_store_is_unavailable():
+    """Test that an unusable shared store leaves a working local-only cache."""
+    # Either `redis` is missing or nothing listens on port 1
+    shared = RedisCacheStore("redis://127.0.0.1:1/0", "test:", timeout_seconds=0.05)
+    cache: TTLCache[str] = TTLCache(max_entries=10, ttl_seconds=60, shared=shared)
+
+    cache.set("a", "1")
+
+    assert cache.get("a") == "1"
+    assert cache.get("b") is None
+    assert not shared.available
@@ -0,0 +1,133 @@
+"""Tests for chat history loading, windowing and paging in the chat router."""
+
+import contextlib
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config.ai import get_openai_client
+from app.config.auth import get_current_user
+from app.config.db import get_session
+from app.config.settings import get_settings
+from app.main import app
+from app.repositories.ai import decode_cursor
+from app.routers import chat
+from app.schemas.auth import UserCreated
+from app.utils.ai import window_messages
+from app.utils.stream import ui_message_text
+from app.utils.tokens import estimate_tokens
+
+USER = UserCreated(id=7, login="octocat")
+
+
+def _message(message_id: str, text: str, role: str = "user") -> dict:
+    return {"id": message_id, "role": role, "parts": [{"type": "text", "text": text}]}
+
+
+@pytest.fixture
+def client():
+    app.dependency_overrides[get_current_user] = lambda: USER
+    app.dependency_overrides[get_session] = lambda: None
+    app.dependency_overrides[get_openai_client] = lambda: None
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_window_keeps_the_most_recent_messages_within_budget():
+    """Test that windowing drops the oldest messages first."""
+    messages = [_message(f"msg-{n}", "palavra " * 40) for n in range(5)]
+    per_message = estimate_tokens(ui_message_text(messages[0]))
+
+    windowed = window_messages(messages, per_message * 2 + per_message // 2)
+
+    assert windowed == messages[-2:]
+    assert window_messages(messages, 0) == messages
+
+
+def test_new_message_reaches_the_prompt_when_history_overflows(client, monkeypatch):
+    """Test that the new message is kept even if no earlier message fits."""
+    monkeypatch.setattr(get_settings(), "CHAT_CONTEXT_MAX_TOKENS", 10)
+    prompts = []
+
+    async def load_chat(session, chat_id, user_id, *args):
+        return [_message("msg-old", "histórico " * 200, "assistant")]
+
+    async def get_user_chat(session, chat_id, user_id):
+        return SimpleNamespace(summary=None, summary_until_id=None)
+
+    async def stream_text_with_persistence(client, messages, *args):
+        prompts.append(messages)
+        yield {"type": "finish"}
+
+    monkeypatch.setattr(chat, "new_session", contextlib.nullcontext)
+    monkeypatch.setattr(chat, "get_user_chat", get_user_chat)
+    monkeypatch.setattr(chat, "load_chat", load_chat)
+    monkeypatch.setattr(
+        chat, "stream_text_with_persistence", stream_text_with_persistence
+    )
+
+    response = client.post(
+        "/chat",
+        json={
+            "id": "chat-window",
+            "message": _message("msg-new", "E a segunda fase?"),
+        },
+    )
+
+    assert response.status_code == 200
+    [prompt] = prompts
+    assert [(m["role"], m["content"]) for m in prompt[1:]] == [
+        ("user", "E a segunda fase?")
+    ]
+
+
+def test_history_without_paging_returns_every_message(client, monkeypatch):
+    """Test that GET /chat/{id} without limit or before returns the full history."""
+    history = [_message(f"msg-{n}", f"mensagem {n}") for n in range(3)]
+    calls = []
+
+    async def load_chat(session, chat_id, user_id, *args):
+        calls.append((chat_id, user_id, args))
+        return history
+
+    monkeypatch.setattr(chat, "load_chat", load_chat)
+
+    response = client.get("/chat/chat-1")
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "id": "chat-1",
+        "messages": history,
+        "next_cursor": None,
+    }
+    assert calls == [("chat-1", USER.id, ())]
+
+
+def test_history_pages_are_capped_and_follow_the_cursor(client, monkeypatch):
+    """Test that a paged GET clamps the limit and passes the decoded cursor."""
+    monkeypatch.setattr(get_settings(), "CHAT_HISTORY_MAX_PAGE_SIZE", 20)
+    page = [_message("msg-9", "mensagem 9")]
+    calls = []
+
+    async def load_chat_page(session, chat_id, user_id, limit, before):
+        calls.append((limit, before))
+        return page, "older"
+
+    monkeypatch.setattr(chat, "load_chat_page", load_chat_page)
+    cursor = "MjAyNi0xMC0xOFQxMjowMDowMHwxMg=="
+
+    response = client.get("/chat/chat-1", params={"limit": 500, "before": cursor})
+
+    assert response.status_code == 200
+    assert response.json() == {"id": "chat-1", "messages": page, "next_cursor": "older"}
+    assert calls == [(20, decode_cursor(cursor))]
+
+
+def test_malformed_cursor_is_a_bad_request(client):
+    """Test that an unreadable cursor is rejected before touching the database."""
+    response = client.get("/chat/chat-1", params={"before": "not-a-cursor"})
+
+    assert response.status_code == 400
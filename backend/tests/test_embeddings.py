@@ -0,0 +1,67 @@
+"""Tests for the query embedding micro-batcher."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import pytest
+
+from app.services.embeddings import QueryEmbeddingBatcher
+
+
+def test_batcher_coalesces_concurrent_queries():
+    """Test that concurrent queries share embed calls and keep their own vectors."""
+    calls: List[List[str]] = []
+
+    def embed_batch(texts: List[str]) -> List[List[float]]:
+        calls.append(texts)
+        return [[float(len(text))] for text in texts]
+
+    batcher = QueryEmbeddingBatcher(
+        embed_batch, max_batch_size=8, max_wait_seconds=0.05
+    )
+    queries = ["a", "bb", "ccc", "bb"] * 4
+    with ThreadPoolExecutor(len(queries)) as executor:
+        vectors = list(executor.map(batcher.embed, queries))
+
+    assert vectors == [[float(len(query))] for query in queries]
+    assert len(calls) < len(queries)
+    assert all(len(batch) == len(set(batch)) for batch in calls)
+    assert batcher.stats()["batches"] == len(calls)
+
+
+def test_batcher_propagates_embed_errors():
+    """Test that a failed embed call raises in every waiting caller."""
+
+    def embed_batch(texts: List[str]) -> List[List[float]]:
+        raise RuntimeError("rate limited")
+
+    batcher = QueryEmbeddingBatcher(embed_batch, max_batch_size=8, max_wait_seconds=0.0)
+
+    with pytest.raises(RuntimeError, match="rate limited"):
+        batcher.embed("a")
+    assert batcher.stats()["errors"] == 1
+
+
+def test_batcher_runs_batches_concurrently():
+    """Test that a slow batch doesn't hold up the batches after it."""
+    release_slow = threading.Event()
+
+    def embed_batch(texts: List[str]) -> List[List[float]]:
+        if "slow" in texts:
+            release_slow.wait(timeout=5)
+        return [[float(len(text))] for text in texts]
+
+    batcher = QueryEmbeddingBatcher(
+        embed_batch, max_batch_size=8, max_wait_seconds=0.0, max_in_flight=2
+    )
+    with ThreadPoolExecutor(1) as executor:
+        slow = executor.submit(batcher.embed, "slow")
+        time.sleep(0.05)  # let the slow batch go out on its own
+
+        assert batcher.embed("fast") == [4.0]
+        assert not slow.done()
+
+        release_slow.set()
+        assert slow.result(timeout=5) == [4.0]
@@ -12,3 +12,11 @@ def test_health_endpoint():
     response = client.get("/health")
     assert response.status_code == 200
     assert response.json() == {"status": "ok"}
+
+
+def test_ready_endpoint_reports_rag_state():
+    """Test that readiness is separate from liveness while the index loads."""
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "not-ready"
+    assert response.json()["rag"]["status"] == "pending"
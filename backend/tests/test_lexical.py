@@ -0,0 +1,37 @@
+"""Tests for the lexical retrieval helpers (tokenizer, BM25, RRF)."""
+
+from app.services.lexical import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_strips_accents_case_and_stopwords():
+    """Test that query terms match regardless of accents and casing."""
+    assert tokenize("Qual é a Taxa de Inscrição?") == ["taxa", "inscricao"]
+
+
+def test_bm25_ranks_exact_term_matches_first():
+    """Test that chunks containing the rare query term rank first."""
+    texts = [
+        "O vestibular tem duas fases e a prova dura cinco horas.",
+        "A taxa de inscrição é de R$ 220,00.",
+        "A prova da segunda fase tem redação e questões dissertativas.",
+    ]
+    index = BM25Index.build(texts)
+
+    assert index.search("valor da taxa de inscrição", k=3) == [1]
+    assert index.search("prova", k=3)[0] in (0, 2)
+
+
+def test_bm25_survives_save_and_load(tmp_path):
+    """Test that a saved index returns the same results after loading."""
+    index = BM25Index.build(["curso 42 engenharia", "curso 15 medicina"])
+    path = tmp_path / "bm25.json"
+    index.save(str(path))
+
+    assert BM25Index.load(str(path)).search("medicina", k=2) == [1]
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    """Test that ids ranked by both lists move ahead of single-list ids."""
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 4, 1]])
+    assert fused[:2] == [1, 3]
+    assert set(fused) == {1, 2, 3, 4}
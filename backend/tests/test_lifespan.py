@@ -0,0 +1,56 @@
+"""Tests for the application lifespan."""
+
+import asyncio
+
+from fastapi.testclient import TestClient
+from openai import AsyncOpenAI
+
+from app import main
+from app.config.settings import get_settings
+from app.main import app
+from app.utils.resumable import StreamRegistry
+
+
+def test_lifespan_opens_and_closes_the_openai_client(monkeypatch):
+    """Test that each lifespan builds a pooled LLM client and closes it on shutdown."""
+
+    stopped = []
+
+    async def run_rag_loader(interval_seconds):
+        # No index to load here; just wait to be cancelled like the real loader
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await asyncio.sleep(0.05)
+            stopped.append(interval_seconds)
+
+    monkeypatch.setattr(main, "run_rag_loader", run_rag_loader)
+    settings = get_settings()
+    # Streams left by other tests belong to event loops that are already closed
+    monkeypatch.setattr(
+        main,
+        "stream_registry",
+        StreamRegistry(
+            settings.STREAM_BUFFER_MAX_STREAMS,
+            settings.STREAM_BUFFER_MAX_EVENTS,
+            settings.STREAM_BUFFER_TTL_SECONDS,
+            settings.STREAM_IDLE_TIMEOUT_SECONDS,
+        ),
+    )
+    clients = []
+
+    # Twice: a second startup must not trip over the first shutdown
+    for _ in range(2):
+        with TestClient(app) as client:
+            openai_client = app.state.openai_client
+            assert isinstance(openai_client, AsyncOpenAI)
+            assert not openai_client.is_closed()
+            pool = openai_client._client._transport._pool  # type: ignore[attr-defined]
+            assert pool._max_connections == settings.OPENAI_MAX_CONNECTIONS
+            assert client.get("/health").status_code == 200
+        # Shutdown waits for the cancelled loader to finish
+        assert len(stopped) == len(clients) + 1
+        clients.append(openai_client)
+
+    assert clients[0] is not clients[1]
+    assert all(openai_client.is_closed() for openai_client in clients)
@@ -0,0 +1,30 @@
+"""Tests for the internal metrics endpoint."""
+
+from fastapi.testclient import TestClient
+
+from app.config.settings import Settings, get_settings
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_metrics_is_disabled_without_a_token():
+    """Test that /metrics is not served when no token is configured."""
+    app.dependency_overrides[get_settings] = lambda: Settings(METRICS_TOKEN="")
+    try:
+        assert client.get("/metrics").status_code == 404
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_metrics_requires_the_bearer_token():
+    """Test that /metrics only answers requests carrying the token."""
+    app.dependency_overrides[get_settings] = lambda: Settings(METRICS_TOKEN="secret")
+    try:
+        assert client.get("/metrics").status_code == 401
+        wrong = client.get("/metrics", headers={"Authorization": "Bearer nope"})
+        assert wrong.status_code == 401
+        right = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+        assert right.status_code == 200
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,50 @@
+"""Tests for packing reranked chunks into the retrieval context."""
+
+from langchain_core.documents import Document
+
+from app.services.packing import merge_chunks, pack_context
+
+PAGE = "0123456789" * 10
+
+
+def chunk(chunk_id: int, start: int, end: int, score: float, page: int = 0) -> Document:
+    return Document(
+        page_content=PAGE[start:end],
+        metadata={
+            "chunk_id": chunk_id,
+            "page": page,
+            "start_index": start,
+            "relevance_score": score,
+        },
+    )
+
+
+def test_merge_chunks_joins_overlapping_chunks_of_a_page():
+    """Test that overlapping chunks become one block without repeated text."""
+    merged = merge_chunks([chunk(1, 30, 70, 0.5), chunk(0, 0, 40, 0.9)])
+
+    assert len(merged) == 1
+    assert merged[0].page_content == PAGE[0:70]
+    assert merged[0].metadata["chunk_ids"] == [0, 1]
+    assert merged[0].metadata["relevance_score"] == 0.9
+
+
+def test_merge_chunks_keeps_other_pages_apart():
+    """Test that chunks of different pages stay separate, best first."""
+    merged = merge_chunks([chunk(0, 0, 40, 0.9, page=2), chunk(1, 30, 70, 0.5, page=3)])
+
+    assert [block.metadata["page"] for block in merged] == [2, 3]
+
+
+def test_pack_context_respects_budget_and_score_ratio():
+    """Test that low-scoring chunks are dropped and the budget is enforced."""
+    documents = [
+        chunk(0, 0, 40, 0.9, page=0),
+        chunk(1, 0, 40, 0.8, page=1),
+        chunk(2, 0, 40, 0.7, page=2),
+        chunk(3, 0, 40, 0.1, page=3),
+    ]
+
+    packed = pack_context(documents, max_tokens=20, min_score_ratio=0.3)
+
+    assert [block.metadata["page"] for block in packed] == [0, 1]
@@ -0,0 +1,34 @@
+"""Tests for building and loading RAG index versions."""
+
+import os
+import sys
+
+import pytest
+from langchain_core.embeddings import FakeEmbeddings
+
+from app.services import rag
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag, "VERSIONS_DIR", str(tmp_path / "versions"))
+    monkeypatch.setattr(rag, "CURRENT_FILE", str(tmp_path / "CURRENT"))
+    monkeypatch.setattr(rag, "EMBEDDING_CACHE_DIR", str(tmp_path / "embedding_cache"))
+    monkeypatch.setattr(rag, "get_embeddings", lambda: FakeEmbeddings(size=32))
+    reranker = rag.build_reranker("local")
+    monkeypatch.setattr(rag, "build_reranker", lambda: reranker)
+    return tmp_path
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="reads /proc/self/maps")
+def test_loaded_version_maps_vectors_from_disk(storage):
+    """Test that a loaded version's FAISS vectors are mmapped, not copied."""
+    version = rag.build_index_version(activate=False)
+    faiss_path = os.path.join(rag.VERSIONS_DIR, version, rag.FAISS_FILE)
+
+    index = rag.load_index_version(version)
+
+    with open("/proc/self/maps") as f:
+        assert os.path.realpath(faiss_path) in f.read()
+    assert index.faiss_index.ntotal == index.manifest["chunks"]
+    assert len(rag.vector_search(index, [0.1] * 32, 3)) == 3
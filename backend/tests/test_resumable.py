@@ -0,0 +1,155 @@
+"""Tests for resuming buffered SSE streams."""
+
+import asyncio
+
+from starlette.background import BackgroundTasks
+
+from app.utils.resumable import StreamRegistry, parse_last_event_id
+
+
+async def events(count: int):
+    for index in range(count):
+        await asyncio.sleep(0)
+        yield f"data: {index}\n\n".encode()
+
+
+async def read(subscription) -> bytes:
+    return b"".join([data async for data in subscription])
+
+
+def test_stream_resumes_after_last_event_id():
+    """Test that a reconnecting client gets only the events it missed."""
+
+    async def scenario():
+        registry = StreamRegistry(max_streams=10, max_events=10, ttl_seconds=60)
+        stream = registry.start(events(4), user_id=1, chat_id="chat")
+        first = await read(stream.subscribe())
+        last_event_id = first.split(b"\n\n")[1].split(b"\n")[0][len(b"id: ") :]
+        _, sequence = parse_last_event_id(last_event_id.decode())
+        resumed = registry.latest_for_chat("chat", user_id=1)
+        assert resumed is stream
+        assert registry.latest_for_chat("chat", user_id=2) is None
+        return await read(resumed.subscribe(sequence))
+
+    rest = asyncio.run(scenario())
+
+    assert rest.count(b"data: ") == 2
+    assert rest.endswith(b"data: 3\n\n")
+
+
+def test_stream_buffer_drops_old_events_and_expired_streams():
+    """Test that only the last events are kept and finished streams expire."""
+
+    async def scenario():
+        registry = StreamRegistry(max_streams=10, max_events=2, ttl_seconds=0)
+        stream = registry.start(events(5), user_id=1, chat_id="chat")
+        assert stream.task is not None
+        await stream.task
+        assert not stream.can_resume(1)
+        assert stream.can_resume(2)
+        assert (
+            await read(stream.subscribe(2))
+            == (
+                f"id: {stream.stream_id}:3\ndata: 3\n\n"
+                f"id: {stream.stream_id}:4\ndata: 4\n\n"
+            ).encode()
+        )
+        return registry.latest_for_chat("chat", user_id=1), registry.stats()
+
+    expired, stats = asyncio.run(scenario())
+
+    assert expired is None
+    assert stats["evicted"] == 1
+
+
+def test_stream_without_clients_is_cancelled():
+    """Test that a stream is cancelled once its last client disconnects."""
+
+    async def endless():
+        while True:
+            await asyncio.sleep(0.01)
+            yield b"data: x\n\n"
+
+    async def scenario():
+        registry = StreamRegistry(10, 10, 60, idle_timeout=0.01)
+        stream = registry.start(endless(), user_id=1)
+        async for _ in stream.subscribe():
+            break
+        assert stream.task is not None
+        await asyncio.wait_for(stream.task, 1)
+        return stream.done, registry.stats()["cancelled"]
+
+    assert asyncio.run(scenario()) == (True, 1)
+
+
+def test_evictor_drops_finished_streams_without_traffic():
+    """Test that the evictor removes expired streams with no start/get calls."""
+
+    async def scenario():
+        registry = StreamRegistry(max_streams=10, max_events=10, ttl_seconds=0)
+        stream = registry.start(events(1), user_id=1, chat_id="chat")
+        assert stream.task is not None
+        await stream.task
+        evictor = asyncio.create_task(registry.run_evictor(0.01))
+        await asyncio.sleep(0.05)
+        evictor.cancel()
+        return registry.stats()
+
+    stats = asyncio.run(scenario())
+
+    assert stats["buffered"] == 0
+    assert stats["evicted"] == 1
+
+
+def test_reconnect_restarts_the_idle_countdown():
+    """Test that a client who reconnects and drops again gets a full idle timeout."""
+
+    async def endless():
+        while True:
+            await asyncio.sleep(0.01)
+            yield b"data: x\n\n"
+
+    async def drop_after_first_event(stream):
+        async for _ in stream.subscribe():
+            break
+
+    async def scenario():
+        registry = StreamRegistry(10, 10, 60, idle_timeout=0.2)
+        stream = registry.start(endless(), user_id=1)
+        await drop_after_first_event(stream)
+        await asyncio.sleep(0.1)
+        await drop_after_first_event(stream)
+        # Past the first drop's timeout, within the second one's
+        await asyncio.sleep(0.15)
+        still_running = not stream.done
+        assert stream.task is not None
+        await asyncio.wait_for(stream.task, 1)
+        return still_running, stream.done
+
+    assert asyncio.run(scenario()) == (True, True)
+
+
+def test_close_callbacks_run_before_background_tasks():
+    """Test that close callbacks fire when the events end, before background work."""
+
+    async def scenario():
+        persisted = asyncio.Event()
+        order = []
+
+        async def persist():
+            await persisted.wait()
+            order.append("background")
+
+        background = BackgroundTasks()
+        background.add_task(persist)
+        registry = StreamRegistry(10, 10, 60)
+        stream = registry.start(events(2), user_id=1, background=background)
+        stream.add_close_callback(lambda: order.append("closed"))
+        await asyncio.sleep(0.01)
+        released_early = order == ["closed"]
+        persisted.set()
+        assert stream.task is not None
+        await stream.task
+        return released_early, order
+
+    assert asyncio.run(scenario()) == (True, ["closed", "background"])
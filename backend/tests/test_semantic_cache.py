@@ -0,0 +1,89 @@
+"""Tests for the semantic answer cache."""
+
+import asyncio
+import time
+
+import numpy as np
+
+from app.services.semantic_cache import SemanticAnswerCache, SemanticProbe
+from app.utils.ai import stream_text
+from tests.fakes import FakeOpenAI, FakeSemanticCache, FakeStream, answer_round, collect
+
+
+def _probe(axis: int) -> SemanticProbe:
+    vector = np.zeros(4, dtype=np.float32)
+    vector[axis] = 1.0
+    return SemanticProbe(vector, "v1", None)
+
+
+def test_store_drops_expired_entries():
+    """Test that expired answers are removed instead of counting toward the limit."""
+    cache = SemanticAnswerCache(threshold=0.9, max_entries=2, ttl_seconds=0.01)
+    cache._reset("v1")
+    cache.store(_probe(0), "old")
+    cache.store(_probe(1), "old")
+    time.sleep(0.02)
+
+    cache.store(_probe(2), "new")
+
+    assert cache.stats()["entries"] == 1
+    assert cache._answers == ["new"]
+    assert cache._vectors is not None and cache._vectors.shape == (1, 4)
+
+
+def _question(text: str) -> dict:
+    return {"role": "user", "content": text}
+
+
+def test_first_turn_is_answered_from_the_cache():
+    """Test that the opening question of a chat is replayed from the cache."""
+    cache = FakeSemanticCache(answer="A prova é em 12 de outubro.")
+    client = FakeOpenAI()
+
+    chunks = asyncio.run(
+        collect(
+            stream_text(
+                client,
+                [{"role": "system", "content": "..."}, _question("Quando é a prova?")],
+                [],
+                {},
+                "gpt-test",
+                semantic_cache=cache,  # type: ignore[arg-type]
+                first_turn=True,
+            )
+        )
+    )
+
+    assert cache.questions == ["Quando é a prova?"]
+    assert client.requests == []
+    assert chunks[-1]["messageMetadata"]["cached"] is True
+
+
+def test_later_turns_skip_the_cache():
+    """Test that a question after a summary or earlier turns never touches the cache."""
+    cache = FakeSemanticCache(answer="resposta de outra conversa")
+    client = FakeOpenAI(FakeStream(answer_round("E a segunda fase?")))
+    messages = [
+        {"role": "system", "content": "..."},
+        {"role": "system", "content": "Resumo da conversa até aqui: ..."},
+        _question("E a segunda?"),
+    ]
+
+    chunks = asyncio.run(
+        collect(
+            stream_text(
+                client,
+                messages,
+                [],
+                {},
+                "gpt-test",
+                semantic_cache=cache,  # type: ignore[arg-type]
+                first_turn=False,
+            )
+        )
+    )
+
+    assert cache.questions == []
+    assert cache.stored == []
+    assert len(client.requests) == 1
+    assert "cached" not in chunks[-1].get("messageMetadata", {})
@@ -0,0 +1,50 @@
+"""Tests for speculative search_edital retrieval."""
+
+import asyncio
+import json
+
+from app.services.speculative import SpeculativeRetrieval, speculation_stats
+from app.utils.ai import execute_tool_call
+
+
+def test_speculation_runs_outside_the_tool_semaphore():
+    """Test that a speculation completes while every tool slot is taken."""
+
+    async def scenario():
+        semaphore = asyncio.Semaphore(1)
+        tools = {"search_edital": lambda query: f"result: {query}"}
+        async with semaphore:
+            speculation = SpeculativeRetrieval(
+                "data da prova",
+                lambda query: execute_tool_call(
+                    tools, "search_edital", json.dumps({"query": query}), 1.0
+                ),
+                min_similarity=0.5,
+            )
+            assert speculation.matches(
+                "search_edital", json.dumps({"query": "data da prova"})
+            )
+            return await asyncio.wait_for(speculation.result(), 1.0)
+
+    assert asyncio.run(scenario()) == "result: data da prova"
+
+
+def test_unused_speculation_is_counted_as_wasted():
+    """Test that discarding an unused speculation records it as wasted."""
+
+    async def scenario():
+        speculation = SpeculativeRetrieval(
+            "data da prova", lambda query: asyncio.sleep(1.0), min_similarity=0.5
+        )
+        assert not speculation.matches(
+            "search_edital", json.dumps({"query": "taxa de inscrição"})
+        )
+        speculation.discard()
+
+    before = speculation_stats.snapshot()
+    asyncio.run(scenario())
+    after = speculation_stats.snapshot()
+
+    assert after["launched"] == before["launched"] + 1
+    assert after["wasted"] == before["wasted"] + 1
+    assert after["reused"] == before["reused"]
@@ -0,0 +1,94 @@
+"""Tests for building and encoding the UI message stream."""
+
+import asyncio
+import json
+
+from app.utils.stream import (
+    UIMessageAccumulator,
+    coalesce_text_deltas,
+    encode_sse,
+    ui_message_text,
+)
+
+
+def test_accumulator_keeps_tool_calls_outputs_and_text():
+    """Test that the assistant message holds tool parts and text in order."""
+    accumulator = UIMessageAccumulator()
+    for chunk in [
+        {"type": "start", "messageId": "msg-1"},
+        {"type": "tool-input-start", "toolCallId": "call-1", "toolName": "search"},
+        {
+            "type": "tool-input-available",
+            "toolCallId": "call-1",
+            "toolName": "search",
+            "input": {"query": "taxa"},
+        },
+        {"type": "tool-output-available", "toolCallId": "call-1", "output": [1]},
+        {"type": "text-start", "id": "text-2"},
+        {"type": "text-delta", "id": "text-2", "delta": "R$ "},
+        {"type": "text-delta", "id": "text-2", "delta": "200"},
+        {"type": "finish", "messageMetadata": {"finishReason": "stop"}},
+    ]:
+        accumulator.add(chunk)
+
+    assert accumulator.message("fallback") == {
+        "id": "msg-1",
+        "role": "assistant",
+        "parts": [
+            {
+                "type": "tool-search",
+                "toolCallId": "call-1",
+                "state": "output-available",
+                "input": {"query": "taxa"},
+                "output": [1],
+            },
+            {"type": "text", "text": "R$ 200"},
+        ],
+        "metadata": {"finishReason": "stop"},
+    }
+
+
+def test_ui_message_text_joins_only_text_parts():
+    """Test that tool parts are left out of a stored message's text."""
+    message = {
+        "role": "assistant",
+        "parts": [
+            {"type": "text", "text": "Vou buscar. "},
+            {"type": "tool-search_edital", "toolCallId": "call_1"},
+            {"type": "text", "text": "A prova é em novembro."},
+        ],
+    }
+
+    assert ui_message_text(message) == "Vou buscar. A prova é em novembro."
+
+
+def test_encode_sse_frames_one_chunk():
+    """Test that a chunk is encoded as a single SSE data event."""
+    chunk = {"type": "text-delta", "id": "text-1", "delta": 'diz "oi"\n'}
+
+    event = encode_sse(chunk)
+
+    assert event.startswith(b"data: ") and event.endswith(b"\n\n")
+    assert json.loads(event[len(b"data: ") :]) == chunk
+    assert json.loads(encode_sse({"type": "finish"})[len(b"data: ") :]) == {
+        "type": "finish"
+    }
+
+
+def test_coalesce_text_deltas_merges_within_the_delay_bound():
+    """Test that deltas merge until another chunk, the size cap or the delay."""
+
+    async def chunks():
+        yield {"type": "text-start", "id": "text-1"}
+        for delta in ["a", "b", "c", "d", "e"]:
+            yield {"type": "text-delta", "id": "text-1", "delta": delta}
+        await asyncio.sleep(0.05)
+        yield {"type": "text-delta", "id": "text-1", "delta": "f"}
+        yield {"type": "text-end", "id": "text-1"}
+
+    async def collect():
+        return [chunk async for chunk in coalesce_text_deltas(chunks(), 0.01, 3)]
+
+    merged = asyncio.run(collect())
+
+    assert [chunk.get("delta") for chunk in merged] == [None, "abc", "de", "f", None]
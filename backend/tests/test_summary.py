@@ -0,0 +1,159 @@
+"""Tests for the rolling chat summary."""
+
+import asyncio
+import contextlib
+from types import SimpleNamespace
+
+import pytest
+
+from app.models import Chat, Message
+from app.services import summary
+from app.utils.stream import ui_message_text
+from app.utils.tokens import estimate_tokens
+
+
+class SummaryClient:
+    """Answers every summary request with `text`, running `during` first."""
+
+    def __init__(self, text: str = "Resumo novo", during=None) -> None:
+        self.text = text
+        self.during = during
+        self.requests: list[dict] = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs):
+        self.requests.append(kwargs)
+        if self.during is not None:
+            self.during()
+        message = SimpleNamespace(content=self.text)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class ChatStore:
+    """In-memory stand-in for the chat row and its messages."""
+
+    def __init__(self, messages: int, summary_until_id=None) -> None:
+        self.chat = Chat(
+            id="chat-1",
+            user_id=1,
+            summary=None if summary_until_id is None else "Resumo antigo",
+            summary_until_id=summary_until_id,
+            summary_source_tokens=0 if summary_until_id is None else 100,
+        )
+        self.messages = [
+            Message(
+                id=n,
+                chat_id="chat-1",
+                message_id=f"msg-{n}",
+                user_id=1,
+                data={
+                    "id": f"msg-{n}",
+                    "role": "user" if n % 2 else "assistant",
+                    "parts": [{"type": "text", "text": f"mensagem {n} " * 20}],
+                },
+            )
+            for n in range(1, messages + 1)
+        ]
+
+    async def get_user_chat(self, session, chat_id, user_id):
+        return Chat(**self.chat.model_dump())
+
+    async def load_unsummarized_messages(self, session, chat):
+        after = chat.summary_until_id or 0
+        return [message for message in self.messages if message.id > after]
+
+    async def save_chat_summary(self, session, chat, text, until_id, source_tokens):
+        # Same guard as the UPDATE: only if no other summary was saved meanwhile
+        if self.chat.summary_until_id != chat.summary_until_id:
+            return False
+        self.chat.summary = text
+        self.chat.summary_until_id = until_id
+        self.chat.summary_source_tokens = source_tokens
+        return True
+
+
+@pytest.fixture
+def store(monkeypatch):
+    def install(messages: int, summary_until_id=None) -> ChatStore:
+        chat_store = ChatStore(messages, summary_until_id)
+        monkeypatch.setattr(summary, "new_session", contextlib.nullcontext)
+        for name in (
+            "get_user_chat",
+            "load_unsummarized_messages",
+            "save_chat_summary",
+        ):
+            monkeypatch.setattr(summary, name, getattr(chat_store, name))
+        return chat_store
+
+    return install
+
+
+def _tokens(messages) -> int:
+    return sum(estimate_tokens(ui_message_text(message.data)) for message in messages)
+
+
+def _update(client, trigger_tokens: int, keep_messages: int = 2) -> None:
+    asyncio.run(
+        summary.update_chat_summary(
+            client, "gpt-test", "chat-1", 1, trigger_tokens, keep_messages
+        )
+    )
+
+
+def test_below_the_threshold_nothing_is_summarised(store):
+    """Test that no LLM call is made while the history fits the trigger."""
+    chat_store = store(4)
+    client = SummaryClient()
+
+    _update(client, _tokens(chat_store.messages))
+
+    assert client.requests == []
+    assert chat_store.chat.summary_until_id is None
+
+
+def test_older_messages_are_folded_into_the_summary(store):
+    """Test that all but the last messages are summarised and marked as such."""
+    chat_store = store(6)
+    client = SummaryClient()
+
+    _update(client, _tokens(chat_store.messages) - 1, keep_messages=2)
+
+    [request] = client.requests
+    prompt = request["messages"][-1]["content"]
+    assert "mensagem 4" in prompt and "mensagem 5" not in prompt
+    assert chat_store.chat.summary == "Resumo novo"
+    assert chat_store.chat.summary_until_id == 4
+    assert chat_store.chat.summary_source_tokens == _tokens(chat_store.messages[:4])
+
+
+def test_summary_skips_messages_already_summarised(store):
+    """Test that a second update only looks past summary_until_id."""
+    chat_store = store(8, summary_until_id=4)
+    client = SummaryClient()
+
+    _update(client, _tokens(chat_store.messages[4:]) - 1, keep_messages=2)
+
+    prompt = client.requests[0]["messages"][-1]["content"]
+    assert "Resumo antigo" in prompt
+    assert "mensagem 4 " not in prompt and "mensagem 6" in prompt
+    assert chat_store.chat.summary_until_id == 6
+    assert chat_store.chat.summary_source_tokens == 100 + _tokens(
+        chat_store.messages[4:6]
+    )
+
+
+def test_concurrent_summary_is_not_overwritten(store):
+    """Test that a summary saved by another turn meanwhile is kept."""
+    chat_store = store(6)
+
+    def other_turn_saves_first():
+        chat_store.chat.summary = "Resumo concorrente"
+        chat_store.chat.summary_until_id = 5
+
+    client = SummaryClient(during=other_turn_saves_first)
+
+    _update(client, _tokens(chat_store.messages) - 1, keep_messages=2)
+
+    assert len(client.requests) == 1
+    assert chat_store.chat.summary == "Resumo concorrente"
+    assert chat_store.chat.summary_until_id == 5
@@ -18,6 +18,8 @@ export default function Chat({ id, initialMessages }: ChatProps) {
     id,
     messages: initialMessages ?? [],
     transport: createFastapiChatTransport(),
+    // Reattach to a reply still being generated (GET /chat/{id}/stream)
+    resume: true,
     onError: (error) => {
       console.error(error);
       toast.error("Erro ao processar mensagem.");